@@ -1,5 +1,6 @@
-from pydantic_settings import BaseSettings
-from typing import Optional
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from typing import Optional, Tuple
+from functools import lru_cache
 import os
 import logging
 
@@ -17,6 +18,7 @@ class Settings(BaseSettings):
     supabase_url: Optional[str] = None
     supabase_anon_key: Optional[str] = None
     supabase_service_role_key: Optional[str] = None
+    supabase_timeout: int = 60  # PostgREST 요청 타임아웃 (초)
     
     # OpenAI API 설정 (핵심)
     openai_api_key: Optional[str] = None
@@ -28,8 +30,8 @@ class Settings(BaseSettings):
     database_url: Optional[str] = None
     log_level: str = "INFO"
     
-    # CORS 설정
-    allowed_origins: list = [
+    # CORS 설정 (프로덕션: 명시된 도메인만 허용)
+    allowed_origins: Tuple[str, ...] = (
         "http://localhost:3000",
         "http://localhost:5173",
         "http://localhost:8080",
@@ -37,8 +39,9 @@ class Settings(BaseSettings):
         "http://127.0.0.1:5173",
         "http://127.0.0.1:8080",
         "http://localhost:4173",  # Vite preview
-        "*"  # 개발 시에만 임시로 모든 도메인 허용
-    ]
+    )
+    # 개발 환경: 로컬 호스트의 모든 포트 허용
+    allowed_origin_regex: str = r"https?://(localhost|127\.0\.0\.1)(:\d+)?"
     
     # JWT 설정 (미래 확장용)
     secret_key: str = "your-secret-key-change-in-production"
@@ -47,26 +50,43 @@ class Settings(BaseSettings):
     
     # 파일 업로드 설정
     max_file_size: int = 10 * 1024 * 1024  # 10MB
-    allowed_file_types: list = [".jpg", ".jpeg", ".png", ".pdf", ".doc", ".docx"]
+    allowed_file_types: Tuple[str, ...] = (".jpg", ".jpeg", ".png", ".pdf", ".doc", ".docx")
     
     # UX 분석 설정
     ux_analysis_batch_size: int = 100
     ux_cache_expire_seconds: int = 3600  # 1시간
+    lookup_cache_expire_seconds: int = 60  # 상품/카테고리/FAQ/후기 조회 API 응답 캐시
+    
+    # 스마트 UI 의미 캐시 설정 (비슷한 요청은 LLM 호출 없이 재사용)
+    openai_embedding_model: str = "text-embedding-3-small"
+    semantic_cache_threshold: float = 0.92
+    semantic_cache_max_entries: int = 256
     
     # LangChain 설정
     langchain_verbose: bool = False
     langchain_cache: bool = True
     
-    class Config:
-        env_file = ".env"
-        case_sensitive = False
-        extra = "ignore"  # 추가 필드 무시
+    model_config = SettingsConfigDict(
+        frozen=True,  # 워커 간 공유되는 불변 인스턴스
+        env_file=".env",
+        case_sensitive=False,
+        extra="ignore"  # 추가 필드 무시
+    )
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """전역 설정 인스턴스 반환 (최초 1회만 파싱, Depends 주입용)"""
+    return Settings()
 
-# 전역 설정 인스턴스
-settings = Settings()
+def __getattr__(name: str):
+    """기존 `from config.settings import settings` 호환 - 지연 생성"""
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def setup_logging():
     """기본 로깅 설정"""
+    settings = get_settings()
     logging.basicConfig(
         level=getattr(logging, settings.log_level.upper()),
         format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -74,6 +94,7 @@ def setup_logging():
 
 def validate_core_settings():
     """핵심 설정 검증"""
+    settings = get_settings()
     warnings = []
     
     if not settings.supabase_url:
@@ -107,6 +128,7 @@ def is_production() -> bool:
 # 설정 검증 (Optional로 변경)
 def validate_settings():
     """필수 설정 값들이 올바르게 설정되었는지 확인"""
+    settings = get_settings()
     warnings = []
     
     if not settings.supabase_url:
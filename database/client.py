@@ -1,22 +1,49 @@
 from supabase import create_client, Client
+from supabase.lib.client_options import ClientOptions
 from typing import Optional
 from config.settings import settings
+import threading
+import asyncio
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# 연결 테스트 결과 캐시 유효 시간 (초)
+_PROBE_TTL = 30.0
+# 마지막 성공 후 이 시간이 지나면 이전 결과를 쓰지 않고 직접 다시 확인 (초)
+_PROBE_MAX_STALE = 120.0
+
 class SupabaseManager:
     """Supabase 연결 관리자"""
     
     def __init__(self):
         self._client: Optional[Client] = None
         self._is_connected = False
+        # URL/키 미설정은 재시도해도 바뀌지 않으므로 한 번만 확인
+        self._is_configured: Optional[bool] = None
+        self._lock = threading.Lock()
+        self._last_ok_ts: float = 0.0
+        self._probe_task: Optional[asyncio.Task] = None
     
     def connect(self) -> bool:
-        """Supabase 연결 시도"""
+        """Supabase 연결 시도 (동시 호출 시 한 번만 핸드셰이크)"""
+        if self._is_connected:
+            return True
+        if self._is_configured is False:
+            return False
+        
+        with self._lock:
+            if self._is_connected:
+                return True
+            return self._connect()
+    
+    def _connect(self) -> bool:
+        """실제 연결 처리 - 반드시 _lock 안에서 호출"""
         try:
             if not settings.supabase_url:
                 logger.warning("Supabase 설정이 없습니다. 오프라인 모드로 실행됩니다.")
+                self._is_configured = False
                 return False
             
             # anon_key 우선 사용, 없으면 service_role_key 사용
@@ -24,29 +51,54 @@ class SupabaseManager:
             
             if not supabase_key:
                 logger.warning("Supabase 키가 없습니다. 오프라인 모드로 실행됩니다.")
+                self._is_configured = False
                 return False
             
+            self._is_configured = True
+            
             self._client = create_client(
                 settings.supabase_url,
-                supabase_key
+                supabase_key,
+                options=ClientOptions(postgrest_client_timeout=settings.supabase_timeout)
             )
             
-            # 연결 테스트
-            response = self._client.table('insurance_categories').select('id').limit(1).execute()
+            # 연결 테스트 (최근에 성공했다면 생략)
+            if not self.probe_is_fresh:
+                self.probe()
             self._is_connected = True
             logger.info("✅ Supabase 연결 성공")
             return True
             
         except Exception as e:
-            logger.error(f"❌ Supabase 연결 실패: {e}")
+            logger.error("❌ Supabase 연결 실패: %s", e)
             self._is_connected = False
             return False
     
+    def probe(self) -> None:
+        """insurance_categories 조회로 연결 확인 - 성공 시각 기록"""
+        self._client.table('insurance_categories').select('id').limit(1).execute()
+        self._last_ok_ts = time.monotonic()
+    
+    def probe_succeeded_within(self, seconds: float) -> bool:
+        """마지막 연결 테스트 성공이 seconds 이내인지 (성공 기록이 없으면 False)"""
+        return bool(self._last_ok_ts) and time.monotonic() - self._last_ok_ts < seconds
+    
+    @property
+    def probe_is_fresh(self) -> bool:
+        """최근 연결 테스트 성공 여부 (_PROBE_TTL 이내)"""
+        return self.probe_succeeded_within(_PROBE_TTL)
+    
+    def schedule_probe_refresh(self) -> None:
+        """백그라운드 연결 테스트 예약 - 이미 진행 중이면 새로 만들지 않음"""
+        if self._probe_task is None or self._probe_task.done():
+            self._probe_task = asyncio.create_task(_refresh_probe())
+    
     @property
     def client(self) -> Optional[Client]:
         """클라이언트 반환"""
-        if not self._is_connected:
-            self.connect()
+        if self._is_connected:
+            return self._client
+        self.connect()
         return self._client
     
     @property
@@ -58,23 +110,35 @@ class SupabaseManager:
 supabase_manager = SupabaseManager()
 
 def get_supabase_client() -> Optional[Client]:
-    """Supabase 클라이언트 반환"""
+    """Supabase 클라이언트 반환 (연결된 뒤에는 캐시된 단일 인스턴스)"""
     return supabase_manager.client
 
 def is_supabase_connected() -> bool:
     """Supabase 연결 상태 확인"""
     return supabase_manager.is_connected
 
-async def test_supabase_connection() -> bool:
-    """Supabase 연결 테스트"""
+async def _refresh_probe() -> bool:
+    """연결 테스트 쿼리 실행"""
     try:
-        client = get_supabase_client()
-        if client is None:
-            return False
-        
-        # 간단한 테스트 쿼리
-        response = client.table('insurance_categories').select('id').limit(1).execute()
+        await asyncio.to_thread(supabase_manager.probe)
         return True
     except Exception as e:
-        logger.error(f"Supabase 연결 테스트 실패: {e}")
-        return False 
\ No newline at end of file
+        logger.error("Supabase 연결 테스트 실패: %s", e)
+        return False
+
+async def test_supabase_connection() -> bool:
+    """Supabase 연결 테스트 (stale-while-revalidate)"""
+    client = get_supabase_client()
+    if client is None:
+        return False
+    
+    if supabase_manager.probe_is_fresh:
+        return True
+    
+    # 최근(_PROBE_MAX_STALE 이내)에 성공했다면 마지막 상태를 반환하고 백그라운드에서 갱신
+    # 백그라운드 갱신이 계속 실패하면 성공 시각이 그대로 남아 곧 아래의 직접 확인으로 넘어감
+    if supabase_manager.probe_succeeded_within(_PROBE_MAX_STALE):
+        supabase_manager.schedule_probe_refresh()
+        return True
+    
+    return await _refresh_probe() 
\ No newline at end of file
@@ -1,27 +1,72 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 import uvicorn
+import asyncio
 import logging
+import os
 
-from config.settings import settings, setup_logging, validate_core_settings
+from config.settings import Settings, get_settings, setup_logging, validate_core_settings
 from routers.ux_router import router as ux_router
+from middleware.response_cache import ResponseCacheMiddleware
 from database.client import supabase_manager
 
 # 로깅 설정
 setup_logging()
 logger = logging.getLogger(__name__)
 
+settings = get_settings()
+
+async def _warmup_supabase():
+    """Supabase 연결 워밍업 (백그라운드)"""
+    if await asyncio.to_thread(supabase_manager.connect):
+        logger.info("✅ 모든 서비스 초기화 완료")
+    else:
+        logger.warning("⚠️ 일부 서비스가 제한된 모드로 실행됩니다")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """서버 시작/종료 처리 - 포트 바인딩을 막지 않도록 무거운 초기화는 백그라운드로"""
+    logger.info("🚀 %s v%s 시작", settings.app_name, settings.version)
+    
+    # 설정 검증 (설정은 실행 중 바뀌지 않으므로 결과를 헬스 체크에서 재사용)
+    app.state.config_valid = validate_core_settings()
+    
+    # Supabase 연결은 백그라운드에서 시도
+    app.state.warmup_task = asyncio.create_task(_warmup_supabase())
+    
+    yield
+    
+    app.state.warmup_task.cancel()
+    logger.info("🛑 서버 종료")
+
 # FastAPI 애플리케이션 생성
 app = FastAPI(
     title=settings.app_name,
     version=settings.version,
-    description="AI 기반 동적 UX 생성 서비스 - LangChain + Supabase"
+    description="AI 기반 동적 UX 생성 서비스 - LangChain + Supabase",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
-# CORS 설정
+# 읽기 전용 조회 API 응답 캐시 (/search는 제외, CORS 안쪽에 위치)
+app.add_middleware(
+    ResponseCacheMiddleware,
+    paths=[
+        f"{ux_router.prefix}/categories",
+        f"{ux_router.prefix}/products",
+        f"{ux_router.prefix}/faqs",
+        f"{ux_router.prefix}/testimonials",
+    ],
+    expire_seconds=settings.lookup_cache_expire_seconds
+)
+
+# CORS 설정 - credentials 허용 시 "*"는 사용 불가 (목록 또는 정규식에 맞는 Origin 허용)
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=settings.allowed_origins,
+    allow_origins=list(settings.allowed_origins),
+    allow_origin_regex=settings.allowed_origin_regex,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -31,7 +76,7 @@ app.add_middleware(
 app.include_router(ux_router)
 
 @app.get("/")
-async def root():
+async def root(settings: Settings = Depends(get_settings)):
     """루트 엔드포인트"""
     return {
         "service": settings.app_name,
@@ -41,38 +86,40 @@ async def root():
     }
 
 @app.get("/health")
-async def health_check():
+async def health_check(settings: Settings = Depends(get_settings)):
     """전역 헬스 체크"""
     return {
         "status": "healthy",
         "service": settings.app_name,
         "database": supabase_manager.is_connected,
-        "config_valid": validate_core_settings()
+        "config_valid": getattr(app.state, "config_valid", False)
     }
 
-@app.on_event("startup")
-async def startup_event():
-    """서버 시작 시 실행"""
-    logger.info(f"🚀 {settings.app_name} v{settings.version} 시작")
+@app.get("/health/live")
+async def health_live():
+    """라이브니스 체크 - 프로세스가 살아있으면 항상 200"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def health_ready():
+    """레디니스 체크 - Supabase 워밍업이 끝나기 전에는 503"""
+    warmup_task = getattr(app.state, "warmup_task", None)
+    ready = supabase_manager.is_connected or (warmup_task is not None and warmup_task.done())
     
-    # 설정 검증
-    validate_core_settings()
+    if not ready:
+        return ORJSONResponse(status_code=503, content={"status": "starting"})
     
-    # Supabase 연결 시도
-    if supabase_manager.connect():
-        logger.info("✅ 모든 서비스 초기화 완료")
-    else:
-        logger.warning("⚠️ 일부 서비스가 제한된 모드로 실행됩니다")
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    """서버 종료 시 실행"""
-    logger.info("🛑 서버 종료")
+    return {
+        "status": "ready",
+        "database": supabase_manager.is_connected
+    }
 
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
         host=settings.host,
         port=settings.port,
-        reload=settings.debug
+        reload=settings.debug,
+        # reload 모드는 단일 워커만 지원
+        workers=1 if settings.debug else (os.cpu_count() or 1)
     )
@@ -0,0 +1,68 @@
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+from typing import Dict, Iterable, Optional, Tuple
+from urllib.parse import urlencode
+import hashlib
+import time
+
+class ResponseCacheMiddleware(BaseHTTPMiddleware):
+    """읽기 전용 GET 응답 인메모리 TTL 캐시 (경로 + 정렬된 쿼리 스트링 기준)"""
+    
+    def __init__(self, app, paths: Iterable[str], expire_seconds: int, max_entries: int = 1024):
+        super().__init__(app)
+        self.paths = frozenset(paths)
+        self.expire_seconds = expire_seconds
+        self.max_entries = max_entries
+        # key -> (만료 시각, body, ETag, media_type)
+        self._cache: Dict[str, Tuple[float, bytes, str, Optional[str]]] = {}
+    
+    def _cache_key(self, request: Request) -> str:
+        """경로 + 정렬된 쿼리 파라미터로 캐시 키 생성"""
+        # 디코딩된 값을 다시 인코딩해야 'a%26limit%3D5' 와 'a&limit=5' 가 다른 키가 됨
+        query = urlencode(sorted(request.query_params.multi_items()))
+        return f"{request.url.path}?{query}"
+    
+    async def dispatch(self, request: Request, call_next):
+        if request.method != "GET" or request.url.path not in self.paths:
+            return await call_next(request)
+        
+        key = self._cache_key(request)
+        entry = self._cache.get(key)
+        
+        if entry and entry[0] > time.monotonic():
+            _, body, etag, media_type = entry
+            return self._cached_response(request, body, etag, media_type)
+        
+        response = await call_next(request)
+        if response.status_code != 200:
+            return response
+        
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        
+        if len(self._cache) >= self.max_entries:
+            self._evict()
+        self._cache[key] = (time.monotonic() + self.expire_seconds, body, etag, response.media_type)
+        
+        return self._cached_response(request, body, etag, response.media_type, response.headers)
+    
+    def _cached_response(self, request: Request, body: bytes, etag: str, media_type: Optional[str], headers=None) -> Response:
+        """ETag 헤더 포함 응답 - If-None-Match 일치 시 304"""
+        response_headers = {k: v for k, v in (headers or {}).items() if k.lower() != "content-length"}
+        response_headers["ETag"] = etag
+        response_headers["Cache-Control"] = f"max-age={self.expire_seconds}"
+        
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=response_headers)
+        
+        return Response(content=body, media_type=media_type, headers=response_headers)
+    
+    def _evict(self):
+        """만료된 항목 정리 후에도 가득 차 있으면 가장 오래된 항목 제거"""
+        now = time.monotonic()
+        for key in [k for k, v in self._cache.items() if v[0] <= now]:
+            del self._cache[key]
+        
+        while len(self._cache) >= self.max_entries:
+            del self._cache[next(iter(self._cache))]
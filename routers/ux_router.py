@@ -1,47 +1,112 @@
+from contextlib import asynccontextmanager
 from fastapi import APIRouter, HTTPException, Query
-from typing import Optional, List, Dict, Any
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from typing import Annotated, Dict, Optional
+import asyncio
+import orjson
 import logging
 
+from config.settings import get_settings
 from schemas.response import SimpleUXResponse
-from services.ux_service_agent import ux_service, smart_ux_service
 from database.client import is_supabase_connected
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/api/v1/ux", tags=["UX Service"])
+router = APIRouter(prefix="/api/v1/ux", tags=["UX Service"], default_response_class=ORJSONResponse)
+
+# LangChain/OpenAI 의존성이 큰 서비스 모듈은 첫 요청 시점에 로드
+_ux_service = None
+_smart_ux_service = None
+
+def _get_ux_service():
+    """ux_service 지연 로드"""
+    global _ux_service
+    if _ux_service is None:
+        from services.ux_service_agent import get_ux_service
+        _ux_service = get_ux_service()
+    return _ux_service
+
+def _get_smart_ux_service():
+    """smart_ux_service 지연 로드"""
+    global _smart_ux_service
+    if _smart_ux_service is None:
+        from services.ux_service_agent import get_smart_ux_service
+        _smart_ux_service = get_smart_ux_service()
+    return _smart_ux_service
+
+# LLM/Supabase 백엔드 동시 호출 수 제한
+_AI_SEM = asyncio.Semaphore(get_settings().ux_analysis_batch_size // 10 or 8)
+_AI_ACQUIRE_TIMEOUT = 0.1
+
+async def _acquire_ai_slot():
+    """AI 호출 슬롯 확보 - 포화 상태면 대기하지 않고 429 반환"""
+    try:
+        await asyncio.wait_for(_AI_SEM.acquire(), timeout=_AI_ACQUIRE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=429, detail="요청이 많아 처리할 수 없습니다. 잠시 후 다시 시도해 주세요.")
+
+@asynccontextmanager
+async def _ai_slot():
+    """요청 처리 동안 AI 호출 슬롯 점유"""
+    await _acquire_ai_slot()
+    try:
+        yield
+    finally:
+        _AI_SEM.release()
+
+class _AISlotStreamingResponse(StreamingResponse):
+    """전송이 끝나거나 실패/취소되면 항상 AI 호출 슬롯을 반환하는 스트리밍 응답
+    
+    BackgroundTask는 정상 종료 시에만 실행되고, 본문 제너레이터의 finally는 연결이 먼저 끊겨
+    제너레이터가 시작조차 못 하면 실행되지 않으므로 응답 전체를 try/finally로 감쌈
+    """
+    
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            _AI_SEM.release()
+
+def _trusted_response(response: SimpleUXResponse) -> ORJSONResponse:
+    """서비스가 직접 구성한 응답은 response_model 재검증 없이 바로 직렬화 (수 KB HTML 재검증 생략)
+    
+    라우트의 response_model_exclude_none=True와 같은 결과가 되도록 None 필드 제외
+    """
+    return ORJSONResponse(response.model_dump(mode="json", exclude_none=True))
 
 # =====================================
 # 🚀 통합된 UI 생성 엔드포인트
 # =====================================
 
-@router.get("/generate-ui", response_model=SimpleUXResponse)
+@router.get("/generate-ui", response_model=SimpleUXResponse, response_model_exclude_none=True)
 async def generate_ui(
     page_type: str = Query(..., description="페이지 타입 (home, search, products)"),
     user_query: Optional[str] = Query(None, description="사용자 검색 쿼리 (search 페이지용)")
 ):
     """🚀 스마트 AI Agent 기반 UI 생성 (완전 자동화)"""
-    try:
-        # 🤖 AI Agent 방식으로 통합
-        if user_query and page_type == 'search':
-            # 사용자 쿼리가 있으면 AI Agent 사용
-            response = await smart_ux_service.generate_smart_ui(user_query)
-        else:
-            # 일반 페이지는 기존 방식 유지 (하지만 개선됨)
-            response = await ux_service.generate_dynamic_ui(
-                page_type=page_type,
-                user_context=None,
-                custom_requirements=user_query
-            )
+    async with _ai_slot():
+        try:
+            # 🤖 AI Agent 방식으로 통합
+            if user_query and page_type == 'search':
+                # 사용자 쿼리가 있으면 AI Agent 사용
+                response = await _get_smart_ux_service().generate_smart_ui(user_query)
+            else:
+                # 일반 페이지는 기존 방식 유지 (하지만 개선됨)
+                response = await _get_ux_service().generate_dynamic_ui(
+                    page_type=page_type,
+                    user_context=None,
+                    custom_requirements=user_query
+                )
         
-        return response
+            return _trusted_response(response)
         
-    except Exception as e:
-        logger.error(f"❌ 스마트 UI 생성 실패: {e}")
-        raise HTTPException(status_code=500, detail=f"UI 생성 실패: {str(e)}")
+        except Exception as e:
+            logger.error("❌ 스마트 UI 생성 실패: %s", e)
+            raise HTTPException(status_code=500, detail=f"UI 생성 실패: {str(e)}")
 
-@router.get("/generate-ui-smart", response_model=SimpleUXResponse)
+@router.get("/generate-ui-smart", response_model=SimpleUXResponse, response_model_exclude_none=True)
 async def generate_smart_ui(
-    query: str = Query(..., description="사용자 요청 (예: '20대에게 추천하는 보험')")
+    query: Annotated[str, Query(min_length=1, pattern=r"\S", description="사용자 요청 (예: '20대에게 추천하는 보험')")]
 ):
     """
     🤖 AI Agent 기반 스마트 UI 생성
@@ -50,19 +115,28 @@ async def generate_smart_ui(
     - 적절한 Tool을 사용해 DB에서 맞는 데이터만 검색  
     - 검색 결과로 맞춤형 UI 생성
     """
-    try:
-        # AI Agent로 UI 생성
-        response = await smart_ux_service.generate_smart_ui(query)
+    async with _ai_slot():
+        try:
+            # AI Agent로 UI 생성
+            response = await _get_smart_ux_service().generate_smart_ui(query)
         
-        return response
+            return _trusted_response(response)
         
-    except Exception as e:
-        logger.error(f"❌ 스마트 AI UI 생성 실패: {e}")
-        import traceback
-        logger.error(f"❌ 라우터 스택 트레이스: {traceback.format_exc()}")
-        raise HTTPException(status_code=500, detail=f"스마트 AI UI 생성 실패: {str(e)}")
+        except Exception as e:
+            logger.exception("❌ 스마트 AI UI 생성 실패: %s", e)
+            raise HTTPException(status_code=500, detail=f"스마트 AI UI 생성 실패: {str(e)}")
+
+@router.get("/generate-ui-smart/stream")
+async def generate_smart_ui_stream(
+    query: Annotated[str, Query(min_length=1, pattern=r"\S", description="사용자 요청 (예: '20대에게 추천하는 보험')")]
+):
+    """🤖 AI Agent 기반 스마트 UI 생성 - LLM이 만드는 HTML을 생성되는 대로 스트리밍"""
+    service = _get_smart_ux_service()
+    await _acquire_ai_slot()
+    # 슬롯은 응답 전송이 어떻게 끝나든 응답 객체가 반환
+    return _AISlotStreamingResponse(service.stream_smart_ui(query), media_type="text/html; charset=utf-8")
 
-@router.post("/generate-ui", response_model=SimpleUXResponse)
+@router.post("/generate-ui", response_model=SimpleUXResponse, response_model_exclude_none=True)
 async def generate_dynamic_ui_post(
     page_type: str,
     user_id: Optional[str] = None,
@@ -70,63 +144,93 @@ async def generate_dynamic_ui_post(
     custom_requirements: Optional[str] = None
 ):
     """동적 UI 생성 - POST 방식 (레거시 호환)"""
-    try:
-        user_context = {}
-        if user_id:
-            user_context['user_id'] = user_id
-        if product_id:
-            user_context['product_id'] = product_id
+    async with _ai_slot():
+        try:
+            user_context = {}
+            if user_id:
+                user_context['user_id'] = user_id
+            if product_id:
+                user_context['product_id'] = product_id
             
-        result = await ux_service.generate_dynamic_ui(
-            page_type=page_type,
-            user_context=user_context,
-            custom_requirements=custom_requirements
-        )
+            result = await _get_ux_service().generate_dynamic_ui(
+                page_type=page_type,
+                user_context=user_context,
+                custom_requirements=custom_requirements
+            )
         
-        return result
+            return _trusted_response(result)
         
-    except Exception as e:
-        logger.error(f"UI 생성 실패: {e}")
-        raise HTTPException(status_code=500, detail=f"UI 생성 중 오류: {str(e)}")
+        except Exception as e:
+            logger.error("UI 생성 실패: %s", e)
+            raise HTTPException(status_code=500, detail=f"UI 생성 중 오류: {str(e)}")
 
 # =====================================
 # 🔍 검색 및 데이터 조회 엔드포인트
 # =====================================
 
+_SEARCH_CATEGORIES = ("products", "faqs", "testimonials")
+
+async def _await_search_result(key: str, task: asyncio.Future) -> list:
+    """카테고리별 검색 결과 대기 - 실패 시 빈 목록"""
+    try:
+        return await task
+    except Exception as e:
+        logger.error("❌ %s 검색 실패: %s", key, e)
+        return []
+
+async def _stream_search_results(q: str, tasks: Dict[str, asyncio.Future]):
+    """검색 결과를 카테고리가 끝나는 대로 JSON 조각으로 전송"""
+    try:
+        yield b'{"success":true,"query":' + orjson.dumps(q) + b',"data":{'
+        total_results = 0
+        for index, key in enumerate(_SEARCH_CATEGORIES):
+            items = await _await_search_result(key, tasks[key]) if key in tasks else []
+            total_results += len(items)
+            yield (b',' if index else b'') + orjson.dumps(key) + b':' + orjson.dumps(items)
+        yield b'},"total_results":' + str(total_results).encode() + b'}'
+    finally:
+        # 클라이언트 연결이 끊긴 경우 남은 조회 취소
+        for task in tasks.values():
+            task.cancel()
+
 @router.get("/search")
 async def search_insurance_content(
-    q: str = Query(..., description="검색 키워드"),
+    q: Annotated[str, Query(min_length=1, pattern=r"\S", description="검색 키워드")],
     limit: int = Query(20, ge=1, le=100, description="결과 개수 제한"),
     include_products: bool = Query(True, description="보험 상품 포함 여부"),
     include_faqs: bool = Query(True, description="FAQ 포함 여부"),
-    include_testimonials: bool = Query(True, description="고객 후기 포함 여부")
+    include_testimonials: bool = Query(True, description="고객 후기 포함 여부"),
+    stream: bool = Query(False, description="카테고리별 스트리밍 응답 여부 (기본은 기존 단일 JSON 응답)")
 ):
     """통합 검색 API - 보험 상품, FAQ, 고객 후기 등을 검색"""
     try:
-        if not q.strip():
-            raise HTTPException(status_code=400, detail="검색어를 입력해주세요.")
+        service = _get_ux_service()
+        
+        # 포함된 카테고리만 동시에 조회 시작
+        tasks = {}
+        if include_products:
+            tasks["products"] = asyncio.ensure_future(service.search_products_only(q, limit))
+        if include_faqs:
+            tasks["faqs"] = asyncio.ensure_future(service.search_faqs_only(q, limit))
+        if include_testimonials:
+            tasks["testimonials"] = asyncio.ensure_future(service.search_testimonials_only(q, limit))
         
-        search_results = await ux_service.search_content(
-            query=q,
-            limit=limit,
-            include_products=include_products,
-            include_faqs=include_faqs,
-            include_testimonials=include_testimonials
-        )
+        if stream:
+            return StreamingResponse(_stream_search_results(q, tasks), media_type="application/json")
+        
+        search_results = {key: [] for key in _SEARCH_CATEGORIES}
+        for key, task in tasks.items():
+            search_results[key] = await _await_search_result(key, task)
         
         return {
             "success": True,
             "query": q,
             "data": search_results,
-            "total_results": sum([
-                len(search_results.get('products', [])),
-                len(search_results.get('faqs', [])),
-                len(search_results.get('testimonials', []))
-            ])
+            "total_results": sum(len(items) for items in search_results.values())
         }
         
     except Exception as e:
-        logger.error(f"검색 실패: {e}")
+        logger.error("검색 실패: %s", e)
         raise HTTPException(status_code=500, detail=f"검색 중 오류: {str(e)}")
 
 @router.get("/products")
@@ -136,27 +240,27 @@ async def get_insurance_products(
 ):
     """보험 상품 조회"""
     try:
-        products = await ux_service.get_insurance_products(category)
+        products, total = await _get_ux_service().get_insurance_products(category, limit=limit)
         return {
             "success": True,
-            "data": products[:limit],
-            "total": len(products)
+            "data": products,
+            "total": total
         }
     except Exception as e:
-        logger.error(f"상품 조회 실패: {e}")
+        logger.error("상품 조회 실패: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/categories")
 async def get_insurance_categories():
     """보험 카테고리 조회"""
     try:
-        categories = await ux_service.get_insurance_categories()
+        categories = await _get_ux_service().get_insurance_categories()
         return {
             "success": True,
             "data": categories
         }
     except Exception as e:
-        logger.error(f"카테고리 조회 실패: {e}")
+        logger.error("카테고리 조회 실패: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/faqs")
@@ -166,14 +270,14 @@ async def get_faqs(
 ):
     """FAQ 조회"""
     try:
-        faqs = await ux_service.get_faqs(category)
+        faqs, total = await _get_ux_service().get_faqs(category, limit=limit)
         return {
             "success": True,
-            "data": faqs[:limit],
-            "total": len(faqs)
+            "data": faqs,
+            "total": total
         }
     except Exception as e:
-        logger.error(f"FAQ 조회 실패: {e}")
+        logger.error("FAQ 조회 실패: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/testimonials")
@@ -183,20 +287,27 @@ async def get_testimonials(
 ):
     """고객 후기 조회"""
     try:
-        testimonials = await ux_service.get_testimonials(product_id)
+        testimonials, total = await _get_ux_service().get_testimonials(product_id, limit=limit)
         return {
             "success": True,
-            "data": testimonials[:limit],
-            "total": len(testimonials)
+            "data": testimonials,
+            "total": total
         }
     except Exception as e:
-        logger.error(f"고객 후기 조회 실패: {e}")
+        logger.error("고객 후기 조회 실패: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 # =====================================
 # 🔧 시스템 관리 엔드포인트
 # =====================================
 
+def _ai_available() -> bool:
+    """AI 사용 가능 여부 - 서비스가 아직 로드되지 않았으면 로드하지 않고 설정만 확인"""
+    service = _ux_service or _smart_ux_service
+    if service is not None:
+        return service.ai_available
+    return bool(get_settings().openai_api_key)
+
 @router.get("/health")
 async def health_check():
     """서비스 상태 확인"""
@@ -205,10 +316,11 @@ async def health_check():
             "status": "healthy",
             "service": "Auto UX Backend",
             "database_connected": is_supabase_connected(),
-            "ai_available": ux_service.ai_available,
+            "ai_available": _ai_available(),
             "endpoints": [
                 "/generate-ui",
                 "/generate-ui-smart",
+                "/generate-ui-smart/stream",
                 "/search",
                 "/products", 
                 "/categories",
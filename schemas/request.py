@@ -1,17 +1,19 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, Any
 from datetime import datetime, date
 import uuid
 
+from schemas.response import UrlPattern
+
 # 기존 호환성을 위한 레거시 스키마
 class UXRequest(BaseModel):
     """기존 UX 추천 요청 (레거시)"""
     user_id: Optional[str] = Field(None, description="사용자 ID")
     session_id: Optional[str] = Field(None, description="세션 ID")
     page_url: str = Field(..., description="현재 페이지 URL")
-    user_actions: Optional[List[Dict[str, Any]]] = Field(default_factory=list, description="사용자 액션 로그")
+    user_actions: Optional[list[dict[str, Any]]] = Field(default_factory=list, description="사용자 액션 로그")
     user_segment: Optional[str] = Field(None, description="사용자 세그먼트")
-    device_info: Optional[Dict[str, Any]] = Field(default_factory=dict, description="디바이스 정보")
+    device_info: Optional[dict[str, Any]] = Field(default_factory=dict, description="디바이스 정보")
     custom_message: Optional[str] = Field(None, description="사용자 커스텀 메시지")
 
 # 보험 서비스 특화 UX 요청 스키마들
@@ -36,16 +38,16 @@ class UserActivityRequest(BaseModel):
     element_text: Optional[str] = None
     ip_address: Optional[str] = None
     user_agent: Optional[str] = None
-    metadata: Optional[Dict[str, Any]] = None
+    metadata: Optional[dict[str, Any]] = None
 
 class InsurancePageGoalRequest(BaseModel):
     """보험 페이지 목표 설정 요청"""
     page_type: str
-    page_url_pattern: str
+    page_url_pattern: UrlPattern
     goal_description: str
-    target_actions: List[str]
+    target_actions: list[str]
     success_criteria: Optional[str] = None
-    conversion_metrics: Optional[Dict[str, Any]] = None
+    conversion_metrics: Optional[dict[str, Any]] = None
     user_segment: Optional[str] = None
     priority: int = 3
 
@@ -56,7 +58,7 @@ class UXMetricRequest(BaseModel):
     page_type: str = Field(..., description="페이지 타입")
     metric_type: str = Field(..., description="메트릭 타입")
     metric_value: float = Field(..., description="메트릭 값")
-    context_data: Optional[Dict[str, Any]] = Field(default_factory=dict, description="컨텍스트 데이터")
+    context_data: Optional[dict[str, Any]] = Field(default_factory=dict, description="컨텍스트 데이터")
 
 class ProductUXRuleRequest(BaseModel):
     """상품별 UX 규칙 생성 요청"""
@@ -64,8 +66,8 @@ class ProductUXRuleRequest(BaseModel):
     category_id: Optional[uuid.UUID] = None
     rule_name: str
     rule_description: Optional[str] = None
-    trigger_conditions: Dict[str, Any]
-    recommended_actions: Dict[str, Any]
+    trigger_conditions: dict[str, Any]
+    recommended_actions: dict[str, Any]
     target_audience: Optional[str] = None
 
 class UXFeedbackRequest(BaseModel):
@@ -74,7 +76,7 @@ class UXFeedbackRequest(BaseModel):
     feedback_score: float  # 1-5 점수
     feedback_comment: Optional[str] = None
     applied: bool = False
-    conversion_impact: Optional[Dict[str, Any]] = None
+    conversion_impact: Optional[dict[str, Any]] = None
 
 class BehaviorAnalysisRequest(BaseModel):
     """사용자 행동 분석 요청"""
@@ -89,10 +91,10 @@ class ABTestRequest(BaseModel):
     description: Optional[str] = None
     page_type: str
     hypothesis: str
-    control_version: Dict[str, Any]
-    variant_versions: Dict[str, Any]
-    traffic_allocation: Dict[str, Any]
-    success_metrics: List[str]
+    control_version: dict[str, Any]
+    variant_versions: dict[str, Any]
+    traffic_allocation: dict[str, Any]
+    success_metrics: list[str]
     start_date: datetime
     end_date: Optional[datetime] = None
 
@@ -100,16 +102,16 @@ class ABTestRequest(BaseModel):
 class ProductRecommendationRequest(BaseModel):
     """보험 상품 추천을 위한 UX 분석 요청"""
     user_id: Optional[uuid.UUID] = None
-    user_profile: Optional[Dict[str, Any]] = None
+    user_profile: Optional[dict[str, Any]] = None
     current_page: str
-    viewed_products: Optional[List[uuid.UUID]] = None
-    user_behavior_data: Optional[Dict[str, Any]] = None
+    viewed_products: Optional[list[uuid.UUID]] = None
+    user_behavior_data: Optional[dict[str, Any]] = None
 
 class ClaimFormOptimizationRequest(BaseModel):
     """보험금 청구 양식 최적화 요청"""
     user_id: Optional[uuid.UUID] = None
     claim_type: str
-    user_difficulties: Optional[List[str]] = None
+    user_difficulties: Optional[list[str]] = None
     form_completion_stage: Optional[str] = None
     device_type: Optional[str] = None
 
@@ -117,17 +119,17 @@ class ConsultationUXRequest(BaseModel):
     """상담 서비스 UX 개선 요청"""
     user_id: Optional[uuid.UUID] = None
     consultation_type: str
-    user_preferences: Optional[Dict[str, Any]] = None
-    previous_consultations: Optional[List[Dict[str, Any]]] = None
+    user_preferences: Optional[dict[str, Any]] = None
+    previous_consultations: Optional[list[dict[str, Any]]] = None
     urgency_level: Optional[str] = None
 
 class AccessibilityAnalysisRequest(BaseModel):
     """접근성 분석 요청"""
     user_id: Optional[uuid.UUID] = None
     page_type: str
-    accessibility_needs: Optional[List[str]] = None
+    accessibility_needs: Optional[list[str]] = None
     user_age: Optional[int] = None
-    device_capabilities: Optional[Dict[str, Any]] = None
+    device_capabilities: Optional[dict[str, Any]] = None
 
 # 동적 UI 생성 요청 스키마들
 class DynamicUIRequest(BaseModel):
@@ -135,15 +137,15 @@ class DynamicUIRequest(BaseModel):
     page_type: str = Field(..., description="페이지 타입 (home, products, claim, mypage, consultation, faq)")
     user_id: Optional[str] = Field(None, description="사용자 ID")
     product_id: Optional[str] = Field(None, description="상품 ID (상품 상세 페이지용)")
-    user_context: Optional[Dict[str, Any]] = Field(default_factory=dict, description="사용자 컨텍스트 정보")
+    user_context: Optional[dict[str, Any]] = Field(default_factory=dict, description="사용자 컨텍스트 정보")
     custom_requirements: Optional[str] = Field(None, description="커스텀 요구사항")
-    accessibility_preferences: Optional[Dict[str, Any]] = Field(default_factory=dict, description="접근성 설정")
+    accessibility_preferences: Optional[dict[str, Any]] = Field(default_factory=dict, description="접근성 설정")
 
 class QuickUIRequest(BaseModel):
     """간편 UI 생성 요청"""
     user_id: Optional[uuid.UUID] = None
     preferences: Optional[str] = None
-    filters: Optional[Dict[str, Any]] = None
+    filters: Optional[dict[str, Any]] = None
 
 class UserInteractionLog(BaseModel):
     """사용자 상호작용 로그"""
@@ -153,7 +155,7 @@ class UserInteractionLog(BaseModel):
     action_type: str = Field(..., description="액션 타입 (click, scroll, hover, input 등)")
     element_selector: Optional[str] = Field(None, description="요소 셀렉터")
     element_text: Optional[str] = Field(None, description="요소 텍스트")
-    metadata: Optional[Dict[str, Any]] = Field(default_factory=dict, description="추가 메타데이터")
+    metadata: Optional[dict[str, Any]] = Field(default_factory=dict, description="추가 메타데이터")
     timestamp: datetime = Field(default_factory=datetime.now, description="타임스탬프")
 
 class FeedbackRequest(BaseModel):
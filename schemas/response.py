@@ -1,48 +1,119 @@
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, ConfigDict, Field, RootModel, model_validator
+from typing import Annotated, Any, Literal, Optional, Union
 from datetime import datetime
+import secrets
+import time
 import uuid
 
+def uuid7() -> uuid.UUID:
+    """시간 순 정렬되는 UUIDv7 생성 (추측 불가능한 secrets 난수 사용)"""
+    unix_ms = time.time_ns() // 1_000_000
+    rand_a = secrets.randbits(12)
+    rand_b = secrets.randbits(62)
+    return uuid.UUID(int=(unix_ms << 80) | (0x7 << 76) | (rand_a << 64) | (0b10 << 62) | rand_b)
+
+# 선택적 문자열 목록 필드 공통 타입 (검증 스키마 공유)
+StrList = Annotated[Optional[list[str]], Field(default=None)]
+
+# 페이지 URL 패턴 (정규식 검증기를 모든 필드가 공유)
+class UrlPattern(RootModel[str]):
+    root: Annotated[str, Field(pattern=r"^\S+$")]
+    
+    def __str__(self) -> str:
+        return self.root
+
+class _SchemaBase(BaseModel):
+    """응답 스키마 공통 베이스 - 검증/직렬화 스키마는 첫 사용 시점에 빌드"""
+    model_config = ConfigDict(defer_build=True)
+
+class _FrozenResponseBase(_SchemaBase):
+    """요청마다 생성 후 버려지는 불변 응답 - 수정 불가 (dict/list 필드가 있어 해시는 불가)"""
+    model_config = ConfigDict(frozen=True)
+
 # 기존 호환성을 위한 레거시 스키마
-class UIComponent(BaseModel):
+class UIComponent(_SchemaBase):
     type: str
     id: str
     title: Optional[str] = None
     content: str
     style: Optional[str] = None
     priority: int = 1
-    data: Optional[Dict[str, Any]] = {}
+    data: Any = Field(default_factory=dict)  # 검증 없이 그대로 전달
 
-class SimpleUXResponse(BaseModel):
+class SimpleUXResponse(_SchemaBase):
     """간소화된 UX 응답 - 프론트엔드 실사용 중심"""
-    components: List[UIComponent]
+    components: list[UIComponent]
     total_products: Optional[int] = None
     generated_at: Optional[str] = None
     ai_generated: bool = False
 
 # 기존 UX 응답 (레거시)
-class UXResponse(BaseModel):
+class LayoutConfig(_SchemaBase):
+    """레이아웃 설정"""
+    type: Literal["stack", "grid", "flex"] = "stack"
+    spacing: Literal["small", "medium", "large"] = "medium"
+
+class A11yConfig(_SchemaBase):
+    """접근성 설정"""
+    high_contrast: bool = False
+    large_text: bool = False
+
+class UXResponse(_SchemaBase):
     """기존 UX 응답 (레거시)"""
-    components: List[UIComponent]
-    layout: Dict[str, Any] = {"type": "stack", "spacing": "medium"}
-    accessibility: Dict[str, Any] = {"high_contrast": False, "large_text": False}
-    metadata: Dict[str, Any] = {}
+    components: list[UIComponent]
+    layout: LayoutConfig = Field(default_factory=LayoutConfig)
+    accessibility: A11yConfig = Field(default_factory=A11yConfig)
+    metadata: dict[str, Any] = Field(default_factory=dict)
 
 # 보험 서비스 특화 응답 스키마들
-class InsuranceUIComponent(BaseModel):
-    """보험 서비스 특화 UI 컴포넌트"""
-    type: str  # product_card, premium_calculator, claim_form, consultation_button, etc.
+class InsuranceUIComponent(_SchemaBase):
+    """보험 서비스 특화 UI 컴포넌트 - type은 열린 문자열 (아래 전용 타입 외 banner 등도 허용)"""
+    type: str  # product_card, premium_calculator, claim_form, consultation_button 등
     position: Optional[str] = None
     content: Optional[str] = None
     style: Optional[str] = None
     priority: int = 3
     reasoning: Optional[str] = None
-    insurance_specific: Optional[Dict[str, Any]] = None
-    accessibility_features: Optional[List[str]] = None
+    insurance_specific: Optional[dict[str, Any]] = None
+    accessibility_features: StrList
     target_user_segment: Optional[str] = None
-    compliance_notes: Optional[List[str]] = None
+    compliance_notes: StrList
+
+class ProductCardComponent(InsuranceUIComponent):
+    """상품 카드"""
+    type: Literal["product_card"] = "product_card"
 
-class InsuranceLayoutChange(BaseModel):
+class PremiumCalculatorComponent(InsuranceUIComponent):
+    """보험료 계산기"""
+    type: Literal["premium_calculator"] = "premium_calculator"
+
+class ClaimFormComponent(InsuranceUIComponent):
+    """보험금 청구 양식"""
+    type: Literal["claim_form"] = "claim_form"
+
+class ConsultationButtonComponent(InsuranceUIComponent):
+    """상담 신청 버튼"""
+    type: Literal["consultation_button"] = "consultation_button"
+
+# 알려진 type 값은 바로 전용 타입으로 분기하는 tagged union
+_TaggedInsuranceUIComponent = Annotated[
+    Union[
+        ProductCardComponent,
+        PremiumCalculatorComponent,
+        ClaimFormComponent,
+        ConsultationButtonComponent,
+    ],
+    Field(discriminator="type")
+]
+
+# 컴포넌트 목록 필드 공통 타입 - 모든 사용처가 같은 목록 스키마를 공유
+# (알려진 type은 전용 타입, 그 외 type은 열린 InsuranceUIComponent로 검증)
+InsuranceUIComponentList = Annotated[
+    list[Union[_TaggedInsuranceUIComponent, InsuranceUIComponent]],
+    Field(default_factory=list)
+]
+
+class InsuranceLayoutChange(_SchemaBase):
     """보험 서비스 레이아웃 변경사항"""
     element: str
     change: str
@@ -50,35 +121,50 @@ class InsuranceLayoutChange(BaseModel):
     impact_on_conversion: Optional[str] = None
     compliance_considerations: Optional[str] = None
 
-class InsuranceBehaviorAnalysis(BaseModel):
+class InsuranceBehaviorAnalysis(_SchemaBase):
     """보험 서비스 사용자 행동 분석"""
     behavior_insights: str
-    pain_points: List[str]
-    user_journey_bottlenecks: Optional[List[str]] = None
-    insurance_specific_issues: Optional[List[str]] = None
-    accessibility_concerns: Optional[List[str]] = None
-    conversion_opportunities: Optional[List[str]] = None
+    pain_points: list[str]
+    user_journey_bottlenecks: StrList
+    insurance_specific_issues: StrList
+    accessibility_concerns: StrList
+    conversion_opportunities: StrList
 
-class InsuranceUXRecommendations(BaseModel):
+class InsuranceUXRecommendations(_SchemaBase):
     """보험 서비스 UX 추천사항"""
-    components: List[InsuranceUIComponent]
-    layout_changes: List[InsuranceLayoutChange]
-    accessibility_improvements: Optional[List[str]] = None
-    conversion_optimizations: Optional[List[str]] = None
-    compliance_notes: Optional[List[str]] = None
-    personalization_suggestions: Optional[List[str]] = None
-
-class InsuranceUXResponse(BaseModel):
+    components: InsuranceUIComponentList
+    layout_changes: list[InsuranceLayoutChange]
+    accessibility_improvements: StrList
+    conversion_optimizations: StrList
+    compliance_notes: StrList
+    personalization_suggestions: StrList
+
+# extras로 옮겨진 InsuranceUXResponse의 이전 최상위 필드
+_LEGACY_EXTRA_FIELDS = frozenset(("confidence_score", "estimated_conversion_impact", "implementation_priority", "user_segment"))
+
+class InsuranceUXResponse(_SchemaBase):
     """보험 서비스 UX 추천 응답"""
     analysis: InsuranceBehaviorAnalysis
     recommendations: InsuranceUXRecommendations
-    confidence_score: Optional[float] = None
-    estimated_conversion_impact: Optional[str] = None
-    implementation_priority: Optional[str] = None
-    user_segment: Optional[str] = None
-    recommendation_id: Optional[uuid.UUID] = None
+    recommendation_id: Optional[uuid.UUID] = Field(default_factory=uuid7)
+    # 드물게 채워지는 부가 정보 (confidence_score, estimated_conversion_impact,
+    # implementation_priority, user_segment 등)
+    extras: Optional[dict[str, Any]] = None
+    
+    @model_validator(mode="before")
+    @classmethod
+    def _move_legacy_fields(cls, data: Any) -> Any:
+        """이전 최상위 필드로 넘긴 값은 버려지지 않도록 extras로 옮김"""
+        if not isinstance(data, dict) or not _LEGACY_EXTRA_FIELDS.intersection(data):
+            return data
+        data = dict(data)
+        extras = dict(data.get("extras") or {})
+        for name in _LEGACY_EXTRA_FIELDS.intersection(data):
+            extras.setdefault(name, data.pop(name))
+        data["extras"] = extras
+        return data
 
-class UserActivityResponse(BaseModel):
+class UserActivityResponse(_FrozenResponseBase):
     """사용자 활동 로그 응답"""
     id: uuid.UUID
     user_id: Optional[uuid.UUID]
@@ -88,19 +174,19 @@ class UserActivityResponse(BaseModel):
     created_at: datetime
     success: bool = True
 
-class UXPageGoalResponse(BaseModel):
+class UXPageGoalResponse(_FrozenResponseBase):
     """UX 페이지 목표 응답"""
     id: uuid.UUID
     page_type: str
-    page_url_pattern: str
+    page_url_pattern: UrlPattern
     goal_description: str
-    target_actions: List[str]
+    target_actions: list[str]
     success_criteria: Optional[str]
     user_segment: Optional[str]
     priority: int
     created_at: datetime
 
-class UXMetricResponse(BaseModel):
+class UXMetricResponse(_FrozenResponseBase):
     """UX 메트릭 응답"""
     id: uuid.UUID
     user_id: Optional[uuid.UUID]
@@ -112,37 +198,37 @@ class UXMetricResponse(BaseModel):
     improvement_percentage: Optional[float]
     recorded_at: datetime
 
-class ProductUXRuleResponse(BaseModel):
+class ProductUXRuleResponse(_SchemaBase):
     """상품별 UX 규칙 응답"""
     id: uuid.UUID
     product_id: Optional[uuid.UUID]
     category_id: Optional[uuid.UUID]
     rule_name: str
     rule_description: Optional[str]
-    trigger_conditions: Dict[str, Any]
-    recommended_actions: Dict[str, Any]
+    trigger_conditions: Any
+    recommended_actions: Any
     target_audience: Optional[str]
     effectiveness_score: Optional[float]
     is_active: bool
     created_at: datetime
 
-class BehaviorInsightResponse(BaseModel):
+class BehaviorInsightResponse(_SchemaBase):
     """사용자 행동 분석 결과 응답"""
     id: uuid.UUID
     user_id: uuid.UUID
     analysis_period_start: datetime
     analysis_period_end: datetime
-    behavior_patterns: Dict[str, Any]
-    pain_points: List[str]
+    behavior_patterns: Any
+    pain_points: list[str]
     user_journey_stage: Optional[str]
-    device_preferences: Optional[Dict[str, Any]]
+    device_preferences: Optional[dict[str, Any]]
     interaction_intensity: Optional[str]
-    drop_off_points: Optional[List[str]]
-    preferred_features: Optional[List[str]]
-    accessibility_needs: Optional[List[str]]
+    drop_off_points: Optional[list[str]]
+    preferred_features: Optional[list[str]]
+    accessibility_needs: Optional[list[str]]
     created_at: datetime
 
-class ABTestResponse(BaseModel):
+class ABTestResponse(_FrozenResponseBase):
     """A/B 테스트 실험 응답"""
     id: uuid.UUID
     experiment_name: str
@@ -152,69 +238,76 @@ class ABTestResponse(BaseModel):
     status: str
     start_date: datetime
     end_date: Optional[datetime]
-    results: Optional[Dict[str, Any]]
+    results: Optional[dict[str, Any]]
     statistical_significance: Optional[float]
     winner_variant: Optional[str]
     created_at: datetime
 
 # 보험 도메인 특화 분석 응답들
-class ProductRecommendationResponse(BaseModel):
+class ProductRecommendation(_SchemaBase):
+    """추천 보험 상품"""
+    product_id: uuid.UUID
+    score: float
+    reason: Optional[str] = None
+    extras: Optional[dict[str, Any]] = None
+
+class ProductRecommendationResponse(_SchemaBase):
     """보험 상품 추천 UX 분석 응답"""
-    recommended_products: List[Dict[str, Any]]
-    ui_optimizations: List[InsuranceUIComponent]
-    personalization_data: Dict[str, Any]
-    conversion_predictions: Optional[Dict[str, float]]
+    recommended_products: list[ProductRecommendation]
+    ui_optimizations: InsuranceUIComponentList
+    personalization_data: dict[str, Any]
+    conversion_predictions: Optional[dict[str, float]]
 
-class ClaimFormOptimizationResponse(BaseModel):
+class ClaimFormOptimizationResponse(_SchemaBase):
     """보험금 청구 양식 최적화 응답"""
-    form_improvements: List[InsuranceUIComponent]
-    simplified_steps: List[str]
-    accessibility_enhancements: List[str]
+    form_improvements: InsuranceUIComponentList
+    simplified_steps: list[str]
+    accessibility_enhancements: list[str]
     estimated_completion_improvement: Optional[str]
 
-class ConsultationUXResponse(BaseModel):
+class ConsultationUXResponse(_SchemaBase):
     """상담 서비스 UX 개선 응답"""
-    consultation_flow_improvements: List[InsuranceLayoutChange]
-    scheduling_optimizations: List[str]
-    communication_preferences: Dict[str, Any]
-    wait_time_optimizations: Optional[List[str]]
+    consultation_flow_improvements: list[InsuranceLayoutChange]
+    scheduling_optimizations: list[str]
+    communication_preferences: dict[str, Any]
+    wait_time_optimizations: Optional[list[str]]
 
-class AccessibilityAnalysisResponse(BaseModel):
+class AccessibilityAnalysisResponse(_SchemaBase):
     """접근성 분석 응답"""
     accessibility_score: float
-    identified_barriers: List[str]
-    recommended_improvements: List[str]
-    compliance_status: Dict[str, str]
-    priority_fixes: List[str]
+    identified_barriers: list[str]
+    recommended_improvements: list[str]
+    compliance_status: dict[str, str]
+    priority_fixes: list[str]
 
 # 통합 대시보드 응답
-class UXDashboardResponse(BaseModel):
+class UXDashboardResponse(_SchemaBase):
     """UX 대시보드 통합 응답"""
     overall_ux_score: float
-    conversion_metrics: Dict[str, float]
-    user_satisfaction_scores: Dict[str, float]
-    top_recommendations: List[InsuranceUIComponent]
-    critical_issues: List[str]
-    improvement_trends: Dict[str, List[float]]
-    page_performance: Dict[str, Dict[str, float]]
+    conversion_metrics: dict[str, float]
+    user_satisfaction_scores: dict[str, float]
+    top_recommendations: InsuranceUIComponentList
+    critical_issues: list[str]
+    improvement_trends: dict[str, list[float]]
+    page_performance: dict[str, dict[str, float]]
 
 # 공통 응답들
-class SuccessResponse(BaseModel):
+class SuccessResponse(_FrozenResponseBase):
     """일반적인 성공 응답"""
     success: bool = True
     message: str
-    data: Optional[Dict[str, Any]] = None
+    data: Optional[dict[str, Any]] = None
 
-class ErrorResponse(BaseModel):
+class ErrorResponse(_FrozenResponseBase):
     """에러 응답"""
     success: bool = False
     message: str
     error_code: Optional[str] = None
-    details: Optional[Dict[str, Any]] = None
+    details: Optional[dict[str, Any]] = None
 
-class PaginatedResponse(BaseModel):
+class PaginatedResponse(_SchemaBase):
     """페이지네이션 응답"""
-    items: List[Any]
+    items: list[Any]
     total: int
     page: int
     size: int
@@ -222,27 +315,27 @@ class PaginatedResponse(BaseModel):
     has_prev: bool
 
 # 동적 UI 생성 응답 스키마들
-class DynamicUIComponent(BaseModel):
+class DynamicUIComponent(_SchemaBase):
     """동적 생성된 UI 컴포넌트"""
     type: str  # InsuranceProductCard, ContractSummary, ClaimStatus 등
-    props: Dict[str, Any]  # 컴포넌트 속성들
-    style: Optional[Dict[str, Any]] = None  # 스타일 정보
-    conditions: Optional[Dict[str, Any]] = None  # 표시 조건들
+    props: Any  # 컴포넌트 속성들
+    style: Optional[dict[str, Any]] = None  # 스타일 정보
+    conditions: Optional[dict[str, Any]] = None  # 표시 조건들
 
-class LayoutInstructions(BaseModel):
+class LayoutInstructions(_SchemaBase):
     """레이아웃 구성 지침"""
     layout_type: str  # grid, flex, stack
-    responsive_breakpoints: Dict[str, str]
-    component_order: List[str]
+    responsive_breakpoints: dict[str, str]
+    component_order: list[str]
     spacing: str
-    accessibility: Dict[str, str]
+    accessibility: dict[str, str]
 
-class DynamicUIResponse(BaseModel):
+class DynamicUIResponse(_SchemaBase):
     """동적 UI 생성 응답"""
     success: bool
-    intent: Optional[Dict[str, Any]] = None  # 분석된 사용자 의도
-    data: Optional[Dict[str, Any]] = None  # 조회된 데이터
-    ui_components: List[DynamicUIComponent]
+    intent: Any = None  # 분석된 사용자 의도
+    data: Any = None  # 조회된 데이터
+    ui_components: list[DynamicUIComponent]
     layout_instructions: Optional[LayoutInstructions] = None
     error: Optional[str] = None
-    fallback_ui: Optional[List[DynamicUIComponent]] = None
+    fallback_ui: Optional[list[DynamicUIComponent]] = None
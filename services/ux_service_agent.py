@@ -1,15 +1,21 @@
 import uuid
-from typing import List, Dict, Any, Optional, Union
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import AsyncIterator, List, Dict, Any, NamedTuple, Optional, Tuple
 import logging
 import asyncio
-import json
-import random
+import threading
 from datetime import datetime
 import re
+import html
+import orjson
+import numpy as np
 
 # LangChain imports
-from langchain_openai import ChatOpenAI
-from langchain.tools import BaseTool
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from langchain.tools import StructuredTool
 from langchain.agents import AgentExecutor, create_openai_functions_agent
 from langchain.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
@@ -20,172 +26,438 @@ from schemas.response import SimpleUXResponse, UIComponent
 
 logger = logging.getLogger(__name__)
 
-# 🛠️ 진짜 동적 SQL 생성 도구
+class _CachedUI(NamedTuple):
+    """스마트 UI 응답 캐시 항목"""
+    expires_at: float
+    slot: Optional[int]  # 임베딩 행렬의 행 번호 (임베딩 실패 시 None)
+    response: SimpleUXResponse
 
-class DynamicSQLGeneratorTool(BaseTool):
-    """🧠 자연어를 진짜 SQL로 변환하여 실행하는 완전 동적 도구"""
-    name = "generate_and_execute_sql"
-    description = """
-    사용자의 자연어 질문을 분석하여 실제 SQL 쿼리를 생성하고 실행합니다.
-    미리 정의된 패턴 없이 LLM이 직접 SQL을 문자열로 생성합니다.
+def _normalize_request(user_request: str) -> str:
+    """캐시 키용 요청 정규화 - 대소문자/공백 차이 무시"""
+    return " ".join(user_request.casefold().split())
+
+# 초 단위로 캐시한 응답 생성 시각 (초, ISO 문자열) - 튜플 한 번 대입이라 스레드 간에도 일관됨
+_ts_cache: Tuple[int, str] = (0, "")
+
+def _now_iso() -> str:
+    """현재 시각 ISO 문자열 (같은 초 안에서는 캐시된 값 재사용)"""
+    global _ts_cache
+    now = int(time.time())
+    if now != _ts_cache[0]:
+        _ts_cache = (now, datetime.fromtimestamp(now).isoformat())
+    return _ts_cache[1]
+
+# 질문 유형별 키워드 (앞에 있을수록 우선순위가 높음)
+_QUESTION_TYPE_KEYWORDS = (
+    ('count', ('몇개', '개수', '수', 'count', '총')),
+    ('recommendation', ('추천', '필요한', '좋은', '적합한', '맞는')),
+    ('statistics', ('평균', '최대', '최소', '통계')),
+    ('popularity', ('인기', '많이', '선호', '베스트')),
+    ('comparison', ('비교', '차이', '대비')),
+)
+_QUESTION_TYPE_BY_KEYWORD = {
+    keyword: question_type
+    for question_type, keywords in _QUESTION_TYPE_KEYWORDS
+    for keyword in keywords
+}
+_QUESTION_TYPE_PRIORITY = {question_type: rank for rank, (question_type, _) in enumerate(_QUESTION_TYPE_KEYWORDS)}
+# 모든 키워드를 한 번의 스캔으로 찾는 정규식 (긴 키워드 우선)
+_QUESTION_KEYWORD_RE = re.compile(
+    "|".join(re.escape(keyword) for keyword in sorted(_QUESTION_TYPE_BY_KEYWORD, key=len, reverse=True))
+)
+
+def _classify_question(question_lower: str) -> Optional[str]:
+    """질문 유형 판별 - 매칭된 키워드 중 우선순위가 가장 높은 유형"""
+    matched = {_QUESTION_TYPE_BY_KEYWORD[m.group()] for m in _QUESTION_KEYWORD_RE.finditer(question_lower)}
+    return min(matched, key=_QUESTION_TYPE_PRIORITY.__getitem__) if matched else None
+
+# 성별/테이블/단일 항목 판별 키워드 (호출마다 리스트를 새로 만들지 않도록 모듈 상수로 유지)
+_FEMALE_KEYWORDS = frozenset(('여성', '여자'))
+_MALE_KEYWORDS = frozenset(('남성', '남자'))
+_GENDER_BY_KEYWORD = {
+    **{keyword: 'female' for keyword in _FEMALE_KEYWORDS},
+    **{keyword: 'male' for keyword in _MALE_KEYWORDS},
+}
+_GENDER_RE = re.compile("|".join(_GENDER_BY_KEYWORD))
+_TABLE_KEYWORDS = (
+    ('users', frozenset(('회원', '사용자', '고객', '가입자'))),
+    ('customer_testimonials', frozenset(('후기', '평점', '리뷰'))),
+    ('faqs', frozenset(('faq', '질문', '답변'))),
+)
+_SINGLE_ITEM_KEYWORDS = frozenset(('하나', '한개', '한 개', '대표적으로'))
+# 단일 항목 키워드를 한 번의 스캔으로 찾는 정규식
+_SINGLE_ITEM_RE = re.compile("|".join(re.escape(keyword) for keyword in _SINGLE_ITEM_KEYWORDS))
+
+# 연령대 텍스트 -> 나이 범위 (질문에서 찾는 순서대로)
+_AGE_GROUPS = {
+    '20대': {'min': 20, 'max': 29},
+    '30대': {'min': 30, 'max': 39},
+    '40대': {'min': 40, 'max': 49},
+    '50대': {'min': 50, 'max': 59},
+    '60대': {'min': 60, 'max': 69},
+}
+_COMPARISON_AGE_GROUPS = ('20대', '30대', '40대', '50대')
+# 지원하는 연령대(20~60대)를 한 번의 스캔으로 찾는 정규식
+_AGE_RE = re.compile(r'[2-6]0대')
+
+def _extract_age_range(question: str) -> Optional[Dict[str, int]]:
+    """질문에서 연령대 추출 (처음 언급된 연령대)"""
+    match = _AGE_RE.search(question)
+    return _AGE_GROUPS[match.group()] if match else None
+
+def _extract_gender(question: str) -> Optional[str]:
+    """질문에서 성별 추출 (처음 언급된 성별)"""
+    match = _GENDER_RE.search(question)
+    return _GENDER_BY_KEYWORD[match.group()] if match else None
+
+def _determine_main_table(question: str) -> str:
+    """질문 내용으로 메인 테이블 결정"""
+    for table, keywords in _TABLE_KEYWORDS:
+        if any(keyword in question for keyword in keywords):
+            return table
+    return 'insurance_products'
+
+class QuestionAnalysis(NamedTuple):
+    """SQL 도구 질문 분석 결과"""
+    question_type: Optional[str]
+    age_range: Optional[Dict[str, int]]
+    gender: Optional[str]
+    main_table: str
+    single_item: bool  # "하나", "대표적으로" 등 한 개만 요청했는지
+
+@lru_cache(maxsize=1024)
+def _analyze_question(question: str) -> QuestionAnalysis:
+    """질문 분석 - 같은 질문이 반복되면 캐시된 결과 반환 (age_range는 공유 객체이므로 수정 금지)"""
+    # 모든 판별을 정규화된 질문 기준으로 - 도구 결과 캐시 키(_normalize_request)가 같으면 분석 결과도 같음
+    question = _normalize_request(question)
+    return QuestionAnalysis(
+        question_type=_classify_question(question),
+        age_range=_extract_age_range(question),
+        gender=_extract_gender(question),
+        main_table=_determine_main_table(question),
+        single_item=_SINGLE_ITEM_RE.search(question) is not None
+    )
+
+# 테이블별 조회 컬럼 - 프롬프트에 안내한 컬럼만 LLM에 전달
+_TABLE_COLUMNS = {
+    'insurance_products': "id,name,description,base_price,max_coverage,age_limit_min,age_limit_max,is_popular,features",
+    'users': "id,name,age,gender,occupation,created_at",
+    'customer_testimonials': "id,title,content,rating,insurance_product_id",
+    'faqs': "id,question,answer,category,view_count",
+}
+
+# 추천 응답 구성에 쓰는 상품 컬럼
+_RECOMMENDATION_COLUMNS = "name,description,base_price,max_coverage,features,age_limit_min,age_limit_max,is_popular"
+
+# 테이블별 통계 대상 숫자 필드
+_STATISTICS_FIELDS = {
+    'insurance_products': ("base_price", "max_coverage"),
+    'users': ("age",),
+    'customer_testimonials': ("rating",),
+}
+
+# LLM 출력에 남은 함수 호출 흔적 제거용 패턴
+# (앞 패턴 제거 후 남은 텍스트에 뒤 패턴을 적용하므로 순서대로 두 번 스캔)
+_FUNCTIONS_CALL_RE = re.compile(r'functions\..*?\)', re.DOTALL)
+_SQL_TOOL_CALL_RE = re.compile(r'generate_and_execute_sql.*?\)', re.DOTALL)
+# LLM 출력이 HTML인지 판별 (<div, <h1, <h2, <h3)
+_HTML_TAG_RE = re.compile(r'<(?:div|h[1-3])')
+
+def _strip_spans(text: str, opener: str, *markers: str) -> str:
+    """opener → markers(순서대로) → 첫 ')' 까지의 구간 제거
+    
+    `opener.*?marker.*?\\)` 정규식과 같은 결과를 str.find 한 번씩으로 선형 처리 (역추적 없음)
     """
+    parts = []
+    pos = 0
+    while True:
+        start = text.find(opener, pos)
+        if start < 0:
+            break
+        cursor = start + len(opener)
+        for marker in markers:
+            cursor = text.find(marker, cursor)
+            if cursor < 0:
+                break
+            cursor += len(marker)
+        if cursor < 0:
+            break
+        end = text.find(')', cursor)
+        if end < 0:
+            break
+        parts.append(text[pos:start])
+        pos = end + 1
+    parts.append(text[pos:])
+    return ''.join(parts)
+
+def _clean_agent_output(text: str) -> str:
+    """LLM 출력에 남은 함수 호출/SQL 흔적 제거"""
+    text = _FUNCTIONS_CALL_RE.sub('', text)
+    text = _SQL_TOOL_CALL_RE.sub('', text)
+    text = _strip_spans(text, 'execute_', '_query')
+    text = _strip_spans(text, '(', 'natural_question')
+    return _strip_spans(text, '(', 'generated_sql_logic')
+
+# 스트리밍 중 ')'로 닫히기 전까지 내보내지 않는 호출 흔적의 시작 문자열
+_CALL_OPENERS = ('functions.', 'generate_and_execute_sql', 'execute_', '(')
+
+def _split_flushable(pending: str) -> Tuple[str, str]:
+    """스트리밍 버퍼를 (지금 정리해 보낼 부분, 다음 조각을 기다릴 부분)으로 분리
     
-    supabase: Any = Field(default=None, exclude=True)
+    완성된 줄 단위로만 내보내되, 닫히지 않은 호출 흔적이 있으면 그 시작부터 보류
+    """
+    cut = pending.rfind('\n') + 1
+    last_close = pending.rfind(')', 0, cut) + 1
+    opened = [pos for pos in (pending.find(opener, last_close, cut) for opener in _CALL_OPENERS) if pos >= 0]
+    if opened:
+        cut = min(opened)
+    return pending[:cut], pending[cut:]
+
+def _release_html(held: Optional[str], raw: str) -> Tuple[str, Optional[str]]:
+    """raw를 정리해 (보낼 문자열, 갱신된 held) 반환
     
-    def __init__(self):
-        super().__init__()
-        supabase_manager.connect()
-        object.__setattr__(self, 'supabase', get_supabase_client())
+    HTML 태그가 나오기 전까지는 held에 모아 두고, 이후(held가 None)에는 바로 전달
+    """
+    cleaned = _clean_agent_output(raw) if raw else ''
+    if held is None:
+        return cleaned, None
+    held += cleaned
+    if _HTML_TAG_RE.search(held):
+        return held, None
+    return '', held
+
+# 도구 결과 행 정렬/크기 제한 (LLM에 전달되는 토큰 수 관리)
+_TERM_RE = re.compile(r'[가-힣a-z0-9]{2,}')
+_ROW_TEXT_FIELDS = ('name', 'description', 'title', 'content', 'question', 'answer')
+_TOOL_ROWS_CHAR_BUDGET = 6000
+
+def _rank_rows_by_relevance(rows: List[Dict[str, Any]], question: str) -> List[Dict[str, Any]]:
+    """질문 단어가 텍스트 필드에 많이 등장하는 행부터 정렬 (동점은 원래 순서 유지)"""
+    terms = set(_TERM_RE.findall(question.casefold()))
+    if not terms:
+        return rows
     
-    class SQLInput(BaseModel):
-        natural_question: str = Field(description="사용자의 자연어 질문")
-        generated_sql_logic: str = Field(description="LLM이 생성한 SQL 로직 설명")
-        expected_result_type: str = Field(description="예상되는 결과 타입 (목록, 통계, 단일값 등)")
+    def score(row: Dict[str, Any]) -> int:
+        text = " ".join(str(row.get(field) or "") for field in _ROW_TEXT_FIELDS).casefold()
+        return sum(term in text for term in terms)
     
-    args_schema = SQLInput
+    return sorted(rows, key=score, reverse=True)
+
+def _fit_rows_to_budget(rows: List[Dict[str, Any]], budget: int = _TOOL_ROWS_CHAR_BUDGET) -> List[Dict[str, Any]]:
+    """직렬화 크기 예산 안에 들어가는 앞쪽 행만 유지 - 문자열 중간에서 자르지 않음"""
+    kept = []
+    used = 0
+    for row in rows:
+        used += len(orjson.dumps(row, default=str))
+        if kept and used > budget:
+            break
+        kept.append(row)
+    return kept
+
+# PostgREST는 like/ilike 패턴의 * 를 모두 % 로 바꾸고 이스케이프 방법이 없으므로 * 는 제거
+_LIKE_ESCAPE = str.maketrans({'\\': '\\\\', '%': '\\%', '_': '\\_', '*': None})
+
+def _ilike_contains(text: str) -> Optional[str]:
+    """부분 일치 ILIKE 패턴 - 사용자 입력의 %, _ 는 와일드카드가 아닌 문자로 취급 (* 제거 후 남는 문자가 없으면 None)"""
+    escaped = text.translate(_LIKE_ESCAPE)
+    return f"%{escaped}%" if escaped else None
+
+def _filter_products_by_age(query, age_range: Dict[str, int]):
+    """연령대 중 한 나이라도 가입 가능한 상품만 조회 (age_limit_min ≤ 최대, age_limit_max ≥ 최소)"""
+    return query.lte('age_limit_min', age_range['max']).gte('age_limit_max', age_range['min'])
+
+# 도구 조회 결과 캐시 (정규화된 질문 → (만료 시각, 결과)) - 도구는 to_thread 워커에서도 실행되므로 락으로 보호
+_TOOL_RESULT_TTL = 60.0
+_TOOL_RESULT_MAX_ENTRIES = 512
+_tool_result_cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_tool_result_lock = threading.Lock()
+
+def _get_tool_result(key: str) -> Optional[Dict[str, Any]]:
+    """캐시된 도구 조회 결과 반환 (만료 시 제거)"""
+    with _tool_result_lock:
+        entry = _tool_result_cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del _tool_result_cache[key]
+            return None
+        _tool_result_cache.move_to_end(key)
+        return entry[1]
+
+def _store_tool_result(key: str, result: Dict[str, Any]) -> None:
+    """도구 조회 결과 저장 - 용량 초과 시 가장 오래 사용되지 않은 항목부터 제거"""
+    with _tool_result_lock:
+        _tool_result_cache[key] = (time.monotonic() + _TOOL_RESULT_TTL, result)
+        _tool_result_cache.move_to_end(key)
+        while len(_tool_result_cache) > _TOOL_RESULT_MAX_ENTRIES:
+            _tool_result_cache.popitem(last=False)
+
+# 도구 안의 서로 독립적인 쿼리를 동시에 실행하는 스레드 풀
+# (도구 자체가 이미 to_thread 워커에서 동기로 실행되므로 이벤트 루프 대신 별도 풀 사용)
+_QUERY_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="sql-tool")
+
+def _execute_all(queries: List[Any]) -> List[Any]:
+    """PostgREST 쿼리들을 병렬 실행하고 입력 순서대로 결과 반환"""
+    return list(_QUERY_POOL.map(lambda query: query.execute(), queries))
+
+def _dump_observation(observation: Dict[str, Any]) -> str:
+    """도구 결과를 compact UTF-8 JSON 문자열로 직렬화 (들여쓰기/유니코드 이스케이프 없이 토큰 절약)"""
+    return orjson.dumps(observation, default=str).decode()
+
+def _load_observation(observation: Any) -> Optional[Dict[str, Any]]:
+    """도구 결과(compact JSON 문자열 또는 dict)를 dict로 복원"""
+    if isinstance(observation, dict):
+        return observation
+    if isinstance(observation, str):
+        try:
+            loaded = orjson.loads(observation)
+        except orjson.JSONDecodeError:
+            return None
+        return loaded if isinstance(loaded, dict) else None
+    return None
+
+# 🤖 완전 동적 HTML 생성 프롬프트 (import 시 한 번만 구성)
+_SQL_AGENT_PROMPT = ChatPromptTemplate.from_messages([
+    # 매 요청 그대로 전송되므로 들여쓰기/중복 문장 없이 유지 (고정 prefix는 OpenAI 프롬프트 캐시 대상)
+    ("system", """당신은 전문 웹 디자이너이자 데이터 분석가입니다. 사용자의 질문을 분석하여 실제 데이터베이스에서 정확한 정보를 조회하고, 결과를 아름답고 현대적인 HTML/CSS로 표현합니다.
+
+**핵심 원칙**:
+1. 절대 SQL 쿼리나 함수 호출을 사용자에게 보여주지 마세요
+2. 실제 데이터베이스 조회 결과를 기반으로만 답변하세요
+3. 반응형, 그라데이션, 그림자, 애니메이션 등 현대적인 디자인과 접근성을 고려하세요
+
+**매우 중요**:
+- 답변은 반드시 <div>로 시작하는 완전한 HTML 코드로 작성하세요 (일반 텍스트 금지)
+- 모든 요소에 인라인 스타일을 풍부하게 적용하세요
+- 배경색 #fafbff 위에 표시됩니다
+- 내용과 말투는 사용자의 질문에 맞춰 자연스럽게 작성하세요
+
+**데이터베이스 정보**:
+- insurance_products: 보험상품 (name, description, base_price, max_coverage, age_limit_min/max, is_popular, features)
+- users: 사용자 (name, age, gender, occupation, created_at)
+- customer_testimonials: 고객후기 (title, content, rating, insurance_product_id)
+- faqs: 자주묻는질문 (question, answer, category, view_count)
+- user_policies: 가입정책 (user_id, insurance_product_id, premium_amount, coverage_amount)
+
+**처리 방법**: generate_and_execute_sql로 실제 데이터를 조회한 뒤, 조회된 데이터를 HTML/CSS로 변환하세요"""),
+    ("user", "{input}"),
+    ("assistant", "{agent_scratchpad}")
+])
+
+# 🛠️ 동적 SQL 도구 입력 스키마 및 실행기
+
+class SQLInput(BaseModel):
+    natural_question: str = Field(description="사용자의 자연어 질문")
+    generated_sql_logic: str = Field(description="LLM이 생성한 SQL 로직 설명")
+    expected_result_type: str = Field(description="예상되는 결과 타입 (목록, 통계, 단일값 등)")
+
+class DynamicSQLExecutor:
+    """🧠 자연어 질문을 분석해 맞는 Supabase 쿼리를 실행하는 완전 동적 실행기 (요청 간 상태 없음)"""
+    
+    @property
+    def supabase(self):
+        """공유 Supabase 클라이언트 - 생성 시점에 미연결이었어도 이후 연결을 따라감"""
+        return get_supabase_client()
     
-    def _run(self, natural_question: str, generated_sql_logic: str, expected_result_type: str) -> Dict[str, Any]:
-        """🚀 동적 SQL 생성 및 실행"""
+    def run(self, natural_question: str, generated_sql_logic: str, expected_result_type: str) -> str:
+        """🚀 동적 SQL 생성 및 실행 - 결과는 LLM에 그대로 전달되는 compact JSON 문자열"""
         try:
-            # LLM이 설명한 로직을 바탕으로 실제 SQL 실행
-            sql_result = self._execute_smart_sql(
-                question=natural_question,
-                logic=generated_sql_logic,
-                result_type=expected_result_type
-            )
+            # 실제 쿼리는 질문 내용으로만 결정되므로 정규화된 질문을 캐시 키로 사용
+            cache_key = _normalize_request(natural_question)
+            sql_result = _get_tool_result(cache_key)
+            if sql_result is None:
+                # LLM이 설명한 로직을 바탕으로 실제 SQL 실행
+                sql_result = self._execute_smart_sql(
+                    question=natural_question,
+                    logic=generated_sql_logic,
+                    result_type=expected_result_type
+                )
+                # 조회 실패 결과는 캐시하지 않음
+                if "error" not in sql_result:
+                    _store_tool_result(cache_key, sql_result)
             
-            return {
+            return _dump_observation({
                 "question": natural_question,
                 "result": sql_result,
                 "result_type": expected_result_type,
                 "success": True
-            }
+            })
                 
         except Exception as e:
-            logger.error(f"❌ 동적 SQL 실행 실패: {e}")
-            return {
+            logger.error("❌ 동적 SQL 실행 실패: %s", e)
+            return _dump_observation({
                 "question": natural_question,
                 "error": str(e),
                 "success": False
-            }
+            })
+    
+    # 질문 유형 -> 처리 메서드 (분석 결과에서 각 메서드에 필요한 값만 전달)
+    _QUESTION_HANDLERS = {
+        'count': lambda self, question, a: self._handle_count_question(question, a.main_table, a.age_range, a.gender),
+        'recommendation': lambda self, question, a: self._handle_recommendation_question(question, a.age_range, a.gender, a.single_item),
+        'statistics': lambda self, question, a: self._handle_statistics_question(question, a.main_table),
+        'popularity': lambda self, question, a: self._handle_popularity_question(question, a.age_range, a.gender),
+        'comparison': lambda self, question, a: self._handle_comparison_question(question),
+        None: lambda self, question, a: self._handle_general_search(question, a.main_table, a.age_range, a.gender),
+    }
     
     def _execute_smart_sql(self, question: str, logic: str, result_type: str) -> Dict[str, Any]:
         """스마트한 SQL 실행 - 질문 내용을 분석하여 적절한 쿼리 생성"""
         
-        # 질문에서 키워드 추출
-        question_lower = question.lower()
-        
-        # 연령대 추출
-        age_range = self._extract_age_range(question)
-        
-        # 성별 추출
-        gender = self._extract_gender(question)
-        
-        # 메인 테이블 결정
-        main_table = self._determine_main_table(question)
+        # 질문 분석 (유형/연령대/성별/메인 테이블을 한 번에)
+        analysis = _analyze_question(question)
         
         try:
-            # 질문 유형에 따라 동적 쿼리 실행
-            if any(keyword in question_lower for keyword in ['몇개', '개수', '수', 'count', '총']):
-                return self._handle_count_question(question, main_table, age_range, gender)
-            
-            elif any(keyword in question_lower for keyword in ['추천', '필요한', '좋은', '적합한', '맞는']):
-                return self._handle_recommendation_question(question, age_range, gender)
-            
-            elif any(keyword in question_lower for keyword in ['평균', '최대', '최소', '통계']):
-                return self._handle_statistics_question(question, main_table)
-            
-            elif any(keyword in question_lower for keyword in ['인기', '많이', '선호', '베스트']):
-                return self._handle_popularity_question(question, age_range, gender)
-            
-            elif any(keyword in question_lower for keyword in ['비교', '차이', '대비']):
-                return self._handle_comparison_question(question)
-            
-            else:
-                # 일반 검색
-                return self._handle_general_search(question, main_table, age_range, gender)
+            # 질문 유형에 따라 동적 쿼리 실행 (유형 없음 → 일반 검색)
+            return self._QUESTION_HANDLERS[analysis.question_type](self, question, analysis)
                 
         except Exception as e:
-            logger.error(f"❌ 스마트 SQL 실행 실패: {e}")
+            logger.error("❌ 스마트 SQL 실행 실패: %s", e)
             return {"error": f"쿼리 실행 실패: {str(e)}"}
     
-    def _extract_age_range(self, question: str) -> Optional[Dict[str, int]]:
-        """질문에서 연령대 추출"""
-        age_patterns = {
-            '20대': {'min': 20, 'max': 29},
-            '30대': {'min': 30, 'max': 39},
-            '40대': {'min': 40, 'max': 49},
-            '50대': {'min': 50, 'max': 59},
-            '60대': {'min': 60, 'max': 69}
-        }
-        
-        for age_text, age_range in age_patterns.items():
-            if age_text in question:
-                return age_range
-        
-        return None
-    
-    def _extract_gender(self, question: str) -> Optional[str]:
-        """질문에서 성별 추출"""
-        if '여성' in question or '여자' in question:
-            return 'female'
-        elif '남성' in question or '남자' in question:
-            return 'male'
-        return None
-    
-    def _determine_main_table(self, question: str) -> str:
-        """질문 내용으로 메인 테이블 결정"""
-        if any(keyword in question for keyword in ['회원', '사용자', '고객', '가입자']):
-            return 'users'
-        elif any(keyword in question for keyword in ['후기', '평점', '리뷰']):
-            return 'customer_testimonials'
-        elif any(keyword in question for keyword in ['FAQ', '질문', '답변']):
-            return 'faqs'
-        else:
-            return 'insurance_products'
-    
     def _handle_count_question(self, question: str, table: str, age_range: Optional[Dict], gender: Optional[str]) -> Dict[str, Any]:
         """개수 관련 질문 처리"""
-        query = self.supabase.table(table).select("*")
+        # 전체 개수는 count=exact 헤더로 받고 행은 샘플 3개만 전송
+        query = self.supabase.table(table).select(_TABLE_COLUMNS.get(table, "*"), count="exact")
         
         # 필터 적용
         if age_range and table == 'insurance_products':
-            query = query.gte('age_limit_min', age_range['min']).lte('age_limit_max', age_range['max'])
+            query = _filter_products_by_age(query, age_range)
         elif age_range and table == 'users':
             query = query.gte('age', age_range['min']).lte('age', age_range['max'])
         
         if gender and table == 'users':
             query = query.eq('gender', gender)
         
-        result = query.execute()
-        count = len(result.data)
+        result = query.limit(3).execute()
+        count = result.count if result.count is not None else len(result.data)
         
         return {
             "type": "count",
             "table": table,
             "count": count,
             "message": f"{table}에서 조건에 맞는 데이터가 {count}개 있습니다.",
-            "sample_data": result.data[:3] if result.data else [],
+            "sample_data": result.data,
             "actual_number": count,  # 실제 숫자 추가
             "question_type": "count_query"
         }
     
-    def _handle_recommendation_question(self, question: str, age_range: Optional[Dict], gender: Optional[str]) -> Dict[str, Any]:
+    def _handle_recommendation_question(self, question: str, age_range: Optional[Dict], gender: Optional[str], single_item: bool) -> Dict[str, Any]:
         """추천 관련 질문 처리"""
-        query = self.supabase.table('insurance_products').select("*")
+        query = self.supabase.table('insurance_products').select(_RECOMMENDATION_COLUMNS)
         
         # 연령대 필터
         if age_range:
-            query = query.gte('age_limit_min', 0).lte('age_limit_min', age_range['max'])
-            query = query.gte('age_limit_max', age_range['min']).lte('age_limit_max', 100)
+            query = _filter_products_by_age(query, age_range)
         
         # 인기 상품 우선
         query = query.eq('is_popular', True)
         
         # "하나" 또는 "대표적으로" 같은 키워드가 있으면 1개만, 아니면 5개
-        limit_count = 1 if any(keyword in question for keyword in ['하나', '한개', '한 개', '대표적으로']) else 5
+        limit_count = 1 if single_item else 5
         
-        result = query.limit(limit_count).execute()
+        # 보험료 낮은 순으로 정렬해 LIMIT 결과를 결정적으로
+        result = query.order('base_price').limit(limit_count).execute()
         
         # 상세한 상품 정보 구성
         detailed_products = []
@@ -215,7 +487,9 @@ class DynamicSQLGeneratorTool(BaseTool):
     
     def _handle_statistics_question(self, question: str, table: str) -> Dict[str, Any]:
         """통계 관련 질문 처리"""
-        query = self.supabase.table(table).select("*")
+        # 통계에 쓰는 숫자 필드만 조회
+        numeric_fields = _STATISTICS_FIELDS.get(table, ())
+        query = self.supabase.table(table).select(",".join(numeric_fields) or "id")
         result = query.execute()
         data = result.data
         
@@ -225,12 +499,6 @@ class DynamicSQLGeneratorTool(BaseTool):
         stats = {"type": "statistics", "table": table, "total_count": len(data), "question_type": "statistics_query"}
         
         # 숫자 필드 통계 계산
-        numeric_fields = {
-            "insurance_products": ["base_price", "max_coverage"],
-            "users": ["age"],
-            "customer_testimonials": ["rating"]
-        }.get(table, [])
-        
         for field in numeric_fields:
             if data and field in data[0]:
                 values = [row[field] for row in data if row.get(field) is not None]
@@ -247,38 +515,45 @@ class DynamicSQLGeneratorTool(BaseTool):
     
     def _handle_popularity_question(self, question: str, age_range: Optional[Dict], gender: Optional[str]) -> Dict[str, Any]:
         """인기도 관련 질문 처리"""
-        query = self.supabase.table('insurance_products').select("*").eq('is_popular', True)
+        query = self.supabase.table('insurance_products').select(_TABLE_COLUMNS['insurance_products']).eq('is_popular', True)
         
         if age_range:
-            query = query.gte('age_limit_min', 0).lte('age_limit_min', age_range['max'])
-            query = query.gte('age_limit_max', age_range['min']).lte('age_limit_max', 100)
+            query = _filter_products_by_age(query, age_range)
         
         result = query.limit(10).execute()
+        popular_products = _fit_rows_to_budget(_rank_rows_by_relevance(result.data, question))
+        # count/actual_number는 LLM에 실제로 전달한 행 수 (크기 제한으로 잘렸으면 조회 개수와 다름)
+        found, sent = len(result.data), len(popular_products)
         
         return {
             "type": "popularity",
-            "popular_products": result.data,
-            "count": len(result.data),
-            "message": f"인기 보험상품 {len(result.data)}개를 찾았습니다.",
-            "actual_number": len(result.data),
+            "popular_products": popular_products,
+            "count": sent,
+            "message": (
+                f"인기 보험상품 {found}개를 찾았습니다." if sent == found
+                else f"인기 보험상품 {found}개를 찾았고, 그중 {sent}개만 전달합니다."
+            ),
+            "actual_number": sent,
             "question_type": "popularity_query"
         }
     
     def _handle_comparison_question(self, question: str) -> Dict[str, Any]:
         """비교 관련 질문 처리"""
         # 연령대별 비교
-        age_groups = ['20대', '30대', '40대', '50대']
         comparison_data = {}
         
-        for age_group in age_groups:
-            age_range = self._extract_age_range(age_group)
-            if age_range:
-                query = self.supabase.table('users').select("*").gte('age', age_range['min']).lte('age', age_range['max'])
-                result = query.execute()
-                comparison_data[age_group] = {
-                    "count": len(result.data),
-                    "sample": result.data[:2]
-                }
+        # 연령대별 쿼리는 서로 독립적이므로 한 번에 병렬 실행 (왕복 4회 → 1회 지연)
+        # 인원수는 count=exact 헤더로 받고 행은 샘플 2개만 전송
+        queries = [
+            self.supabase.table('users').select(_TABLE_COLUMNS['users'], count="exact")
+            .gte('age', _AGE_GROUPS[age_group]['min']).lte('age', _AGE_GROUPS[age_group]['max']).limit(2)
+            for age_group in _COMPARISON_AGE_GROUPS
+        ]
+        for age_group, result in zip(_COMPARISON_AGE_GROUPS, _execute_all(queries)):
+            comparison_data[age_group] = {
+                "count": result.count if result.count is not None else len(result.data),
+                "sample": result.data
+            }
         
         return {
             "type": "comparison",
@@ -289,40 +564,126 @@ class DynamicSQLGeneratorTool(BaseTool):
     
     def _handle_general_search(self, question: str, table: str, age_range: Optional[Dict], gender: Optional[str]) -> Dict[str, Any]:
         """일반 검색 처리"""
-        query = self.supabase.table(table).select("*")
+        query = self.supabase.table(table).select(_TABLE_COLUMNS.get(table, "*"))
         
         # 기본 필터 적용
-        if age_range and table == 'users':
+        if age_range and table == 'insurance_products':
+            query = _filter_products_by_age(query, age_range)
+        elif age_range and table == 'users':
             query = query.gte('age', age_range['min']).lte('age', age_range['max'])
         
         if gender and table == 'users':
             query = query.eq('gender', gender)
         
         result = query.limit(10).execute()
+        rows = _fit_rows_to_budget(_rank_rows_by_relevance(result.data, question))
+        # count/actual_number는 LLM에 실제로 전달한 행 수 (크기 제한으로 잘렸으면 조회 개수와 다름)
+        found, sent = len(result.data), len(rows)
         
         return {
             "type": "general_search",
             "table": table,
-            "data": result.data,
-            "count": len(result.data),
-            "message": f"{table}에서 {len(result.data)}개의 결과를 찾았습니다.",
-            "actual_number": len(result.data),
+            "data": rows,
+            "count": sent,
+            "message": (
+                f"{table}에서 {found}개의 결과를 찾았습니다." if sent == found
+                else f"{table}에서 {found}개의 결과를 찾았고, 그중 {sent}개만 전달합니다."
+            ),
+            "actual_number": sent,
             "question_type": "general_query"
         }
     
-    async def _arun(self, *args, **kwargs):
-        return self._run(*args, **kwargs)
+    async def arun(self, natural_question: str, generated_sql_logic: str, expected_result_type: str) -> str:
+        """동기 Supabase 호출이 이벤트 루프를 막지 않도록 스레드에서 실행"""
+        return await asyncio.to_thread(self.run, natural_question, generated_sql_logic, expected_result_type)
+
+_sql_executor = DynamicSQLExecutor()
+
+# 🛠️ 진짜 동적 SQL 생성 도구 (상태가 없으므로 import 시 한 번만 만들어 모든 Agent가 공유)
+SQL_TOOL = StructuredTool.from_function(
+    func=_sql_executor.run,
+    coroutine=_sql_executor.arun,
+    name="generate_and_execute_sql",
+    description="사용자의 자연어 질문을 분석하여 실제 SQL 쿼리를 생성하고 실행합니다. 미리 정의된 패턴 없이 LLM이 직접 SQL을 문자열로 생성합니다.",
+    args_schema=SQLInput
+)
+
+# LLM이 HTML을 생성하지 않았을 때 쓰는 안내 템플릿 ({request}는 이스케이프된 사용자 요청)
+_PENDING_HTML_TMPL = """
+<div style="
+    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+    padding: 40px;
+    border-radius: 25px;
+    color: white;
+    margin: 30px 0;
+    box-shadow: 0 25px 50px rgba(0,0,0,0.3);
+">
+<h2>📋 요청 처리 중</h2>
+<p>{request}에 대한 정보를 처리하고 있습니다.</p>
+</div>
+"""
+
+# 스트리밍 중 도구 조회가 끝나자마자 먼저 보내는 요약 템플릿 ({message}는 이스케이프된 조회 요약)
+_TOOL_RESULT_HTML_TMPL = """
+<div style="
+    background: #f5f7ff;
+    padding: 16px 24px;
+    border-radius: 15px;
+    color: #4a4a8a;
+    margin: 20px 0;
+">
+<p>🔍 {message}</p>
+</div>
+"""
+
+# 동적 SQL 실패 시 폴백 컴포넌트 원본 (내용이 고정이므로 import 시 한 번만 생성, 응답에는 id를 바꾼 사본 사용)
+_FALLBACK_COMPONENT = UIComponent(
+    type="html",
+    id=str(uuid.uuid4()),
+    content="""
+            <div style="
+                background: linear-gradient(135deg, #ff9a9e 0%, #fecfef 100%);
+                padding: 40px;
+                border-radius: 35px;
+                color: #333;
+                text-align: center;
+                box-shadow: 0 25px 50px rgba(0,0,0,0.2);
+                animation: pulse 2.5s infinite;
+                border: 3px solid rgba(255,255,255,0.35);
+            ">
+                <h3 style="margin: 0 0 30px 0; font-size: 26px; font-weight: 800;">🤖 동적 SQL 서비스 일시 중단</h3>
+                <p style="margin: 0; line-height: 2.0; font-size: 18px;">
+                    현재 실시간 데이터 분석 기능을 이용할 수 없습니다.<br>
+                    잠시 후 다시 시도해 주세요.
+                </p>
+            </div>
+            
+            <style>
+            @keyframes pulse {
+                0% { transform: scale(1); }
+                50% { transform: scale(1.08); }
+                100% { transform: scale(1); }
+            }
+            </style>
+    """,
+    style="margin: 35px 0;"
+)
 
 class TrueDynamicSQLService:
     """🤖 진짜 동적 SQL 서비스 - LLM이 직접 SQL 로직 생성"""
     
     def __init__(self):
-        try:
-            supabase_manager.connect()
-            self.supabase = get_supabase_client()
-            
-        except Exception as e:
-            logger.error(f"❌ 데이터베이스 연결 실패: {e}")
+        # 정규화된 요청 -> 캐시 항목 (LRU 순서 유지)
+        self._ui_cache: "OrderedDict[str, _CachedUI]" = OrderedDict()
+        # 요청 임베딩 행렬 (용량 x 차원, L2 정규화 float32) - 첫 저장 시 차원에 맞춰 할당
+        self._emb_matrix: Optional[np.ndarray] = None
+        self._slot_keys: List[Optional[str]] = [None] * settings.semantic_cache_max_entries
+        self._free_slots: List[int] = list(range(settings.semantic_cache_max_entries - 1, -1, -1))
+        self.embeddings: Optional[OpenAIEmbeddings] = None
+        # 진행 중인 조회 (같은 키의 동시 요청은 하나의 Supabase 호출을 공유)
+        self._lookup_inflight: Dict[Tuple, asyncio.Future] = {}
+        # LLM 초기화 직후 한 번 구성해 모든 요청이 재사용하는 Agent 실행기
+        self._agent_executor: Optional[AgentExecutor] = None
         
         # OpenAI 초기화
         if settings.openai_api_key:
@@ -333,11 +694,17 @@ class TrueDynamicSQLService:
                     temperature=0.1,
                     max_tokens=4000
                 )
+                self.embeddings = OpenAIEmbeddings(
+                    openai_api_key=settings.openai_api_key,
+                    model=settings.openai_embedding_model
+                )
+                # 프롬프트/Agent/실행기는 요청 간 상태가 없으므로 서비스 생성 시 미리 구성
+                self._agent_executor = self._build_agent_executor()
                 
                 self.ai_available = True
                 
             except Exception as e:
-                logger.error(f"❌ SQL 서비스 초기화 실패: {e}")
+                logger.error("❌ SQL 서비스 초기화 실패: %s", e)
                 self.ai_available = False
         else:
             self.ai_available = False
@@ -348,138 +715,259 @@ class TrueDynamicSQLService:
             if not self.ai_available:
                 return self._generate_fallback_response()
             
-            # 🛠️ 동적 SQL 도구 초기화
-            tools = [DynamicSQLGeneratorTool()]
+            # 1차: 정규화된 요청 문자열 일치
+            cache_key = _normalize_request(user_request)
+            cached = self._get_cached_ui(cache_key)
+            if cached is not None:
+                return cached
             
-            # 🤖 완전 동적 HTML 생성 프롬프트
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", """
-                당신은 전문 웹 디자이너이자 데이터 분석가입니다. 사용자의 질문을 분석하여 실제 데이터베이스에서 정확한 정보를 조회하고, 결과를 아름답고 현대적인 HTML/CSS로 표현합니다.
-
-                **핵심 원칙**:
-                1. 절대 SQL 쿼리나 함수 호출을 사용자에게 보여주지 마세요
-                2. 실제 데이터베이스 조회 결과를 기반으로만 답변하세요
-                3. 현대적이고 아름다운 HTML/CSS 디자인을 창작하세요
-                4. 반응형, 그라데이션, 그림자, 애니메이션 등을 적극 활용하세요
-
-                **매우 중요**: 
-                - 답변은 반드시 완전한 HTML 코드로 작성하세요
-                - 모든 요소에 인라인 스타일을 풍부하게 적용하세요
-                - 일반 텍스트로 답변하지 마세요
-                - background-color는 #fafbff 입니다. 고려하여 스타일을 적용하세요
-                - 태그의 시작은 <div> 입니다. 고려하여 코드를 작성하세요
-                - 사용자의 질문에 따라 자연스럽게 대답하세요
-                - 말투는 사용자의 질문에 따라 자연스럽게 대답하세요
-
-                **데이터베이스 정보**:
-                - insurance_products: 보험상품 (name, description, base_price, max_coverage, age_limit_min/max, is_popular, features)
-                - users: 사용자 (name, age, gender, occupation, created_at)
-                - customer_testimonials: 고객후기 (title, content, rating, insurance_product_id)
-                - faqs: 자주묻는질문 (question, answer, category, view_count)
-                - user_policies: 가입정책 (user_id, insurance_product_id, premium_amount, coverage_amount)
-
-                **처리 방법**:
-                1. generate_and_execute_sql로 실제 데이터를 조회하세요
-                2. 조회된 실제 데이터를 아름다운 HTML/CSS로 변환하세요
-                3. 현대적인 웹 디자인 트렌드를 반영하세요
-                4. 반응형과 접근성을 고려하세요
-                """),
-                ("user", "{input}"),
-                ("assistant", "{agent_scratchpad}")
-            ])
-            
-            # 🤖 Agent 생성 및 실행
-            agent = create_openai_functions_agent(
-                llm=self.llm,
-                tools=tools,
-                prompt=prompt
+            # 2차: 의미가 비슷한 요청 (임베딩 코사인 유사도)
+            # 임베딩 API 호출 동안 도구가 쓸 Supabase 연결도 함께 준비
+            embedding, _ = await asyncio.gather(
+                self._embed_request(cache_key),
+                self._warmup_supabase()
             )
+            if embedding is not None:
+                cached = self._find_similar_ui(cache_key, embedding)
+                if cached is not None:
+                    return cached
             
-            agent_executor = AgentExecutor(
-                agent=agent,
-                tools=tools,
-                verbose=False,
-                max_iterations=3,
-                handle_parsing_errors=True,
-                return_intermediate_steps=True
-            )
+            agent_executor = self._get_agent_executor()
             
             # 🚀 Agent 실행
             result = await agent_executor.ainvoke({"input": user_request})
             
             # 결과를 그대로 HTML로 변환 (LLM이 이미 HTML을 생성했다면)
-            components = self._convert_llm_output_to_ui(
+            components, generated_html = self._convert_llm_output_to_ui(
                 user_request, 
-                result.get('output', ''),
-                result.get('intermediate_steps', [])
+                result.get('output', '')
             )
             
-            final_response = SimpleUXResponse(
+            # 내부에서 구성한 신뢰 데이터이므로 재검증 생략
+            final_response = SimpleUXResponse.model_construct(
                 components=components,
                 total_products=None,
-                generated_at=datetime.now().isoformat(),
+                generated_at=_now_iso(),
                 ai_generated=True
             )
+            # LLM이 HTML을 만들지 못한 안내 응답은 캐시하지 않음
+            if generated_html:
+                self._store_cached_ui(cache_key, embedding, final_response)
             return final_response
             
         except Exception as e:
-            logger.error(f"❌ 동적 HTML Agent 실행 실패: {e}")
-            import traceback
-            traceback.print_exc()
+            # 스택 트레이스는 핸들러가 실제로 기록할 때만 포맷됨
+            logger.exception("❌ 동적 HTML Agent 실행 실패: %s", e)
             return self._generate_fallback_response()
     
+    @property
+    def supabase(self):
+        """공유 Supabase 클라이언트 - SQL 도구와 같은 인스턴스(같은 PostgREST 세션)를 사용하고, 생성 시점에 미연결이었어도 이후 연결을 따라감"""
+        return get_supabase_client()
+    
+    def _get_cached_ui(self, cache_key: str) -> Optional[SimpleUXResponse]:
+        """정규화된 요청과 정확히 일치하는 캐시 응답 반환"""
+        entry = self._ui_cache.get(cache_key)
+        if entry is None:
+            return None
+        
+        if entry.expires_at < time.monotonic():
+            self._drop_cached_ui(cache_key)
+            return None
+        
+        return self._cache_hit(cache_key, entry)
+    
+    def _find_similar_ui(self, cache_key: str, embedding: np.ndarray) -> Optional[SimpleUXResponse]:
+        """임베딩 코사인 유사도가 임계값 이상이고 질문 조건이 같은 가장 비슷한 캐시 응답 반환"""
+        if self._emb_matrix is None or self._emb_matrix.shape[1] != embedding.shape[0]:
+            return None
+        
+        # 저장된 모든 임베딩과의 유사도를 행렬-벡터 곱 한 번으로 계산 (빈 슬롯은 0)
+        scores = self._emb_matrix @ embedding
+        candidates = np.flatnonzero(scores >= settings.semantic_cache_threshold)
+        
+        # "20대"/"30대", 남/여처럼 조건만 다른 짧은 요청은 유사도가 높아도 다른 답이 필요
+        analysis = _analyze_question(cache_key)
+        now = time.monotonic()
+        for slot in candidates[np.argsort(-scores[candidates])]:
+            cached_key = self._slot_keys[slot]
+            entry = self._ui_cache.get(cached_key) if cached_key is not None else None
+            if entry is None:
+                continue
+            if entry.expires_at < now:
+                self._drop_cached_ui(cached_key)
+                continue
+            if _analyze_question(cached_key) != analysis:
+                continue
+            return self._cache_hit(cached_key, entry)
+        return None
+    
+    def _cache_hit(self, cache_key: str, entry: _CachedUI) -> SimpleUXResponse:
+        """LRU 순서 갱신 후 생성 시각만 바꾼 응답 반환"""
+        self._ui_cache.move_to_end(cache_key)
+        return entry.response.model_copy(update={"generated_at": _now_iso()})
+    
+    def _store_cached_ui(self, cache_key: str, embedding: Optional[np.ndarray], response: SimpleUXResponse) -> None:
+        """응답 캐시 저장 - 용량 초과 시 가장 오래 사용되지 않은 항목부터 제거"""
+        self._drop_cached_ui(cache_key)
+        
+        slot = self._store_embedding(cache_key, embedding) if embedding is not None else None
+        self._ui_cache[cache_key] = _CachedUI(
+            expires_at=time.monotonic() + settings.ux_cache_expire_seconds,
+            slot=slot,
+            response=response
+        )
+        while len(self._ui_cache) > settings.semantic_cache_max_entries:
+            self._drop_cached_ui(next(iter(self._ui_cache)))
+    
+    def _store_embedding(self, cache_key: str, embedding: np.ndarray) -> Optional[int]:
+        """빈 슬롯(없으면 LRU 항목을 밀어내고)에 임베딩 기록 후 슬롯 번호 반환"""
+        if self._emb_matrix is None:
+            self._emb_matrix = np.zeros((len(self._slot_keys), embedding.shape[0]), dtype=np.float32)
+        elif self._emb_matrix.shape[1] != embedding.shape[0]:
+            return None
+        
+        while not self._free_slots and self._ui_cache:
+            self._drop_cached_ui(next(iter(self._ui_cache)))
+        if not self._free_slots:
+            return None
+        
+        slot = self._free_slots.pop()
+        self._emb_matrix[slot] = embedding
+        self._slot_keys[slot] = cache_key
+        return slot
+    
+    def _drop_cached_ui(self, cache_key: str) -> None:
+        """캐시 항목 제거 - 임베딩 슬롯도 비워서 재사용"""
+        entry = self._ui_cache.pop(cache_key, None)
+        if entry is None or entry.slot is None:
+            return
+        self._emb_matrix[entry.slot] = 0.0
+        self._slot_keys[entry.slot] = None
+        self._free_slots.append(entry.slot)
+    
+    async def _warmup_supabase(self) -> None:
+        """Supabase 미연결 상태면 스레드에서 연결 (이벤트 루프 비차단)"""
+        if not supabase_manager.is_connected:
+            await asyncio.to_thread(supabase_manager.connect)
+    
+    async def _embed_request(self, text: str) -> Optional[np.ndarray]:
+        """요청 임베딩 (L2 정규화) - 실패 시 의미 캐시만 건너뜀"""
+        if self.embeddings is None:
+            return None
+        try:
+            vector = np.asarray(await self.embeddings.aembed_query(text), dtype=np.float32)
+        except Exception as e:
+            logger.warning("⚠️ 요청 임베딩 실패, 의미 캐시 생략: %s", e)
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+    
+    async def stream_smart_ui(self, user_request: str) -> AsyncIterator[str]:
+        """🧠 동적 HTML을 LLM이 생성하는 대로 조각 단위로 전달"""
+        if not self.ai_available:
+            yield self._generate_fallback_response().components[0].content
+            return
+        
+        streamed = False
+        # 정리 전 버퍼 (미완성 줄 / 닫히지 않은 호출 흔적) 와 첫 HTML 태그 전까지 보류한 출력
+        pending = ''
+        held: Optional[str] = ''
+        try:
+            agent_executor = self._get_agent_executor()
+            
+            # 도구 호출 단계의 LLM 출력은 내용이 비어 있으므로 최종 HTML 토큰만 전달됨
+            async for event in agent_executor.astream_events({"input": user_request}, version="v2"):
+                kind = event["event"]
+                if kind == "on_tool_end":
+                    # LLM이 HTML을 쓰기 전에 조회 요약부터 전달해 첫 화면 표시를 앞당김
+                    summary = self._summarize_tool_output(event["data"].get("output"))
+                    if summary:
+                        streamed = True
+                        yield summary
+                    continue
+                if kind != "on_chat_model_stream":
+                    continue
+                content = event["data"]["chunk"].content
+                if not content:
+                    continue
+                # generate_smart_ui와 같은 호출 흔적 정리를 거친 뒤에만 전달
+                ready, pending = _split_flushable(pending + content)
+                output, held = _release_html(held, ready)
+                if output:
+                    streamed = True
+                    yield output
+            
+            output, held = _release_html(held, pending)
+            if output:
+                streamed = True
+                yield output
+            if held is not None:
+                # LLM이 HTML을 생성하지 않았으면 generate_smart_ui와 같은 안내 템플릿
+                streamed = True
+                yield _PENDING_HTML_TMPL.format(request=html.escape(user_request))
+                    
+        except Exception as e:
+            logger.error("❌ 동적 HTML 스트리밍 실패: %s", e)
+            if not streamed:
+                yield self._generate_fallback_response().components[0].content
+    
+    def _summarize_tool_output(self, output: Any) -> Optional[str]:
+        """도구 결과의 조회 요약 메시지를 HTML 조각으로 변환 (요약이 없으면 None)"""
+        observation = _load_observation(output)
+        if observation is None:
+            return None
+        result_data = observation.get('result')
+        if not isinstance(result_data, dict) or not result_data.get('message'):
+            return None
+        return _TOOL_RESULT_HTML_TMPL.format(message=html.escape(str(result_data['message'])))
+    
+    def _get_agent_executor(self) -> AgentExecutor:
+        """Agent 실행기 반환 - 생성 시 구성에 실패했을 때만 다시 구성"""
+        if self._agent_executor is None:
+            self._agent_executor = self._build_agent_executor()
+        return self._agent_executor
+    
+    def _build_agent_executor(self) -> AgentExecutor:
+        """동적 SQL 도구 + HTML 생성 프롬프트로 Agent 실행기 구성"""
+        tools = [SQL_TOOL]
+        
+        # 🤖 Agent 생성
+        agent = create_openai_functions_agent(
+            llm=self.llm,
+            tools=tools,
+            prompt=_SQL_AGENT_PROMPT
+        )
+        
+        return AgentExecutor(
+            agent=agent,
+            tools=tools,
+            # 중간 단계 stdout 출력은 설정으로 켤 때만 (기본 꺼짐)
+            verbose=settings.langchain_verbose,
+            max_iterations=3,
+            handle_parsing_errors=True
+        )
+    
     def _convert_llm_output_to_ui(
         self, 
         original_request: str,
-        agent_output: str, 
-        intermediate_steps: List
-    ) -> List[UIComponent]:
-        """LLM 결과를 UI 컴포넌트로 변환 - 이제 LLM이 HTML을 직접 생성"""
-        
-        # LLM 출력에서 HTML 추출 또는 직접 사용
-        clean_output = agent_output
+        agent_output: str
+    ) -> Tuple[List[UIComponent], bool]:
+        """LLM 결과를 UI 컴포넌트로 변환 - 이제 LLM이 HTML을 직접 생성 (컴포넌트, LLM HTML 사용 여부)"""
         
         # SQL 관련 함수 호출은 여전히 제거
-        clean_output = re.sub(r'functions\..*?\)', '', clean_output, flags=re.DOTALL)
-        clean_output = re.sub(r'generate_and_execute_sql.*?\)', '', clean_output, flags=re.DOTALL)
-        clean_output = re.sub(r'execute_.*?_query.*?\)', '', clean_output, flags=re.DOTALL)
-        clean_output = re.sub(r'\([\s\S]*?natural_question[\s\S]*?\)', '', clean_output)
-        clean_output = re.sub(r'\([\s\S]*?generated_sql_logic[\s\S]*?\)', '', clean_output)
+        clean_output = _clean_agent_output(agent_output)
         
         # LLM 출력이 이미 HTML인지 확인
-        if '<div' in clean_output or '<h1' in clean_output or '<h2' in clean_output or '<h3' in clean_output:
-            # LLM이 이미 올바른 HTML을 생성했다면 그대로 사용 (데이터 주입 안함)
+        generated_html = _HTML_TAG_RE.search(clean_output) is not None
+        if generated_html:
+            # LLM이 이미 올바른 HTML을 생성했다면 그대로 사용 (데이터 주입 안함 - 도구 결과 재파싱 불필요)
             final_output = clean_output
-            
-            # 실제 데이터가 올바르게 포함되었는지만 확인
-            if self._has_recommendation_data(intermediate_steps):
-                recommendation_data = self._extract_recommendation_data(intermediate_steps)
-                # 데이터 주입하지 않고 그대로 사용
-            
-            # 실제 숫자 데이터 확인만 (주입하지 않음)
-            else:
-                actual_data = self._extract_actual_numbers(intermediate_steps)
-                if actual_data and 'count' in actual_data:
-                    # 데이터 주입하지 않고 그대로 사용
-                    pass
-                
         else:
             # LLM이 HTML을 생성하지 않은 경우에만 폴백
-            final_output = f"""
-<div style="
-    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-    padding: 40px;
-    border-radius: 25px;
-    color: white;
-    margin: 30px 0;
-    box-shadow: 0 25px 50px rgba(0,0,0,0.3);
-">
-<h2>📋 요청 처리 중</h2>
-<p>{original_request}에 대한 정보를 처리하고 있습니다.</p>
-</div>
-"""
+            final_output = _PENDING_HTML_TMPL.format(request=html.escape(original_request))
         
-        return [UIComponent(
+        return [UIComponent.model_construct(
             type="content",
             id=str(uuid.uuid4()),
             title="",
@@ -487,100 +975,14 @@ class TrueDynamicSQLService:
             data={},
             style="",
             priority=1
-        )]
-    
-    def _extract_actual_numbers(self, intermediate_steps: List) -> Optional[Dict]:
-        """intermediate_steps에서 실제 숫자 데이터 추출"""
-        try:
-            for step in intermediate_steps:
-                if hasattr(step, '__len__') and len(step) >= 2:
-                    action, observation = step[0], step[1]
-                    
-                    if isinstance(observation, dict):
-                        result_data = observation.get('result', {})
-                        
-                        if isinstance(result_data, dict):
-                            # 실제 숫자가 있는지 확인
-                            if 'actual_number' in result_data:
-                                return {'count': result_data['actual_number']}
-                            elif 'count' in result_data:
-                                return {'count': result_data['count']}
-                            elif 'total_count' in result_data:
-                                return {'count': result_data['total_count']}
-            
-            return None
-        except Exception as e:
-            logger.error(f"❌ 숫자 데이터 추출 실패: {e}")
-            return None
-    
-    def _has_recommendation_data(self, intermediate_steps: List) -> bool:
-        """추천 데이터가 있는지 확인"""
-        try:
-            for step in intermediate_steps:
-                if hasattr(step, '__len__') and len(step) >= 2:
-                    action, observation = step[0], step[1]
-                    if isinstance(observation, dict):
-                        result_data = observation.get('result', {})
-                        if isinstance(result_data, dict) and result_data.get('type') == 'recommendation':
-                            return True
-            return False
-        except Exception as e:
-            logger.error(f"❌ 추천 데이터 확인 실패: {e}")
-            return False
-    
-    def _extract_recommendation_data(self, intermediate_steps: List) -> Optional[Dict]:
-        """추천 데이터 추출"""
-        try:
-            for step in intermediate_steps:
-                if hasattr(step, '__len__') and len(step) >= 2:
-                    action, observation = step[0], step[1]
-                    if isinstance(observation, dict):
-                        result_data = observation.get('result', {})
-                        if isinstance(result_data, dict) and result_data.get('type') == 'recommendation':
-                            return result_data
-            return None
-        except Exception as e:
-            logger.error(f"❌ 추천 데이터 추출 실패: {e}")
-            return None
+        )], generated_html
     
     def _generate_fallback_response(self) -> SimpleUXResponse:
-        """동적 SQL 실패 시 폴백 응답"""
-        fallback_component = UIComponent(
-            type="html",
-            id=str(uuid.uuid4()),
-            content="""
-            <div style="
-                background: linear-gradient(135deg, #ff9a9e 0%, #fecfef 100%);
-                padding: 40px;
-                border-radius: 35px;
-                color: #333;
-                text-align: center;
-                box-shadow: 0 25px 50px rgba(0,0,0,0.2);
-                animation: pulse 2.5s infinite;
-                border: 3px solid rgba(255,255,255,0.35);
-            ">
-                <h3 style="margin: 0 0 30px 0; font-size: 26px; font-weight: 800;">🤖 동적 SQL 서비스 일시 중단</h3>
-                <p style="margin: 0; line-height: 2.0; font-size: 18px;">
-                    현재 실시간 데이터 분석 기능을 이용할 수 없습니다.<br>
-                    잠시 후 다시 시도해 주세요.
-                </p>
-            </div>
-            
-            <style>
-            @keyframes pulse {{
-                0% {{ transform: scale(1); }}
-                50% {{ transform: scale(1.08); }}
-                100% {{ transform: scale(1); }}
-            }}
-            </style>
-            """,
-            style="margin: 35px 0;"
-        )
-        
-        return SimpleUXResponse(
-            components=[fallback_component],
+        """동적 SQL 실패 시 폴백 응답 - 고정 컴포넌트라 검증 없이 구성 (id만 응답마다 새로 발급)"""
+        return SimpleUXResponse.model_construct(
+            components=[_FALLBACK_COMPONENT.model_copy(update={"id": str(uuid.uuid4())})],
             total_products=None,
-            generated_at=datetime.now().isoformat(),
+            generated_at=_now_iso(),
             ai_generated=False
         )
 
@@ -609,7 +1011,7 @@ class TrueDynamicSQLService:
             return await self.generate_smart_ui(query)
             
         except Exception as e:
-            logger.error(f"❌ 동적 UI 생성 실패: {e}")
+            logger.error("❌ 동적 UI 생성 실패: %s", e)
             return self._generate_fallback_response()
     
     async def search_content(
@@ -620,92 +1022,127 @@ class TrueDynamicSQLService:
         include_faqs: bool = True,
         include_testimonials: bool = True
     ) -> Dict[str, Any]:
-        """기존 ux_service.py 호환 - 콘텐츠 검색"""
+        """기존 ux_service.py 호환 - 콘텐츠 검색 (테이블별 조회 동시 실행)"""
         try:
             results = {"products": [], "faqs": [], "testimonials": []}
             
+            # 포함된 테이블만 조회 - 쿼리 구성과 실행 모두 스레드에서 동시에
+            searches = {}
             if include_products:
-                products_query = self.supabase.table('insurance_products').select("*")
-                if query:
-                    products_query = products_query.ilike('name', f'%{query}%')
-                products_result = products_query.limit(limit).execute()
-                results["products"] = products_result.data
-            
+                searches["products"] = self.search_products_only(query, limit)
             if include_faqs:
-                faqs_query = self.supabase.table('faqs').select("*")
-                if query:
-                    faqs_query = faqs_query.ilike('question', f'%{query}%')
-                faqs_result = faqs_query.limit(limit).execute()
-                results["faqs"] = faqs_result.data
-            
+                searches["faqs"] = self.search_faqs_only(query, limit)
             if include_testimonials:
-                testimonials_query = self.supabase.table('customer_testimonials').select("*")
-                if query:
-                    testimonials_query = testimonials_query.ilike('title', f'%{query}%')
-                testimonials_result = testimonials_query.limit(limit).execute()
-                results["testimonials"] = testimonials_result.data
+                searches["testimonials"] = self.search_testimonials_only(query, limit)
+            
+            for key, rows in zip(searches, await asyncio.gather(*searches.values())):
+                results[key] = rows
             
             return results
             
         except Exception as e:
-            logger.error(f"❌ 콘텐츠 검색 실패: {e}")
+            logger.error("❌ 콘텐츠 검색 실패: %s", e)
             return {"products": [], "faqs": [], "testimonials": []}
     
-    async def get_insurance_products(self, category: Optional[str] = None) -> List[Dict[str, Any]]:
-        """기존 ux_service.py 호환 - 보험 상품 조회"""
-        try:
-            query = self.supabase.table('insurance_products').select("*")
-            if category:
-                query = query.eq('category_id', category)
-            result = query.execute()
-            return result.data
-        except Exception as e:
-            logger.error(f"❌ 보험 상품 조회 실패: {e}")
-            return []
+    async def search_products_only(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """보험 상품 이름 검색"""
+        return await asyncio.to_thread(self._search_table, 'insurance_products', 'name', query, limit)
+    
+    async def search_faqs_only(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """FAQ 질문 검색"""
+        return await asyncio.to_thread(self._search_table, 'faqs', 'question', query, limit)
+    
+    async def search_testimonials_only(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """고객 후기 제목 검색"""
+        return await asyncio.to_thread(self._search_table, 'customer_testimonials', 'title', query, limit)
+    
+    def _search_table(self, table: str, column: str, query: str, limit: int) -> List[Dict[str, Any]]:
+        """단일 테이블 ILIKE 검색 (스레드에서 실행)"""
+        return self._build_search_query(table, column, query, limit).execute().data
+    
+    def _build_search_query(self, table: str, column: str, query: str, limit: int):
+        """단일 테이블 ILIKE 검색 쿼리 구성 (실행하지 않음)"""
+        table_query = self.supabase.table(table).select("*")
+        if query:
+            pattern = _ilike_contains(query)
+            if pattern is None:
+                # '*' 만으로 된 검색어는 전체 일치가 되므로 빈 결과
+                return table_query.limit(0)
+            table_query = table_query.ilike(column, pattern)
+        return table_query.limit(limit)
+    
+    # 조회 결과 캐시는 라우터 앞단의 ResponseCacheMiddleware 한 곳에서만 관리
+    # 조회 실패는 빈 결과로 삼키지 않고 예외로 전달 - 라우터가 5xx로 응답해야 응답 캐시에 빈 목록이 남지 않음
+    
+    async def get_insurance_products(self, category: Optional[str] = None, limit: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """기존 ux_service.py 호환 - 보험 상품 조회 (데이터, 전체 개수)"""
+        return await self._shared_lookup(self._fetch_products, category, limit)
     
     async def get_insurance_categories(self) -> List[Dict[str, Any]]:
         """기존 ux_service.py 호환 - 보험 카테고리 조회"""
-        try:
-            result = self.supabase.table('insurance_categories').select("*").execute()
-            return result.data
-        except Exception as e:
-            logger.error(f"❌ 보험 카테고리 조회 실패: {e}")
-            return []
+        return await self._shared_lookup(self._fetch_categories)
     
-    async def get_faqs(self, category: Optional[str] = None) -> List[Dict[str, Any]]:
-        """기존 ux_service.py 호환 - FAQ 조회"""
-        try:
-            query = self.supabase.table('faqs').select("*")
-            if category:
-                query = query.eq('category', category)
-            result = query.execute()
-            return result.data
-        except Exception as e:
-            logger.error(f"❌ FAQ 조회 실패: {e}")
-            return []
+    async def get_faqs(self, category: Optional[str] = None, limit: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """기존 ux_service.py 호환 - FAQ 조회 (데이터, 전체 개수)"""
+        return await self._shared_lookup(self._fetch_faqs, category, limit)
     
-    async def get_testimonials(self, product_id: Optional[str] = None) -> List[Dict[str, Any]]:
-        """기존 ux_service.py 호환 - 고객 후기 조회"""
-        try:
-            query = self.supabase.table('customer_testimonials').select("*")
-            if product_id:
-                query = query.eq('insurance_product_id', product_id)
-            result = query.execute()
-            return result.data
-        except Exception as e:
-            logger.error(f"❌ 고객 후기 조회 실패: {e}")
-            return []
-
-# 전역 인스턴스 생성
-try:
-    smart_ux_service = TrueDynamicSQLService()
-except Exception as e:
-    logger.error(f"❌ 진짜 동적 SQL 전역 인스턴스 생성 실패: {e}")
-    # 폴백용 인스턴스 생성
-    smart_ux_service = TrueDynamicSQLService()
-    smart_ux_service.ai_available = False
+    async def get_testimonials(self, product_id: Optional[str] = None, limit: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """기존 ux_service.py 호환 - 고객 후기 조회 (데이터, 전체 개수)"""
+        return await self._shared_lookup(self._fetch_testimonials, product_id, limit)
+    
+    async def _shared_lookup(self, fetch, *args) -> Any:
+        """스레드에서 fetch 실행 - 같은 (조회 메서드, 인자)의 동시 요청은 한 번만 조회"""
+        key = (fetch.__name__, *args)
+        task = self._lookup_inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(asyncio.to_thread(fetch, *args))
+            self._lookup_inflight[key] = task
+            task.add_done_callback(lambda _: self._lookup_inflight.pop(key, None))
+        # 한 호출자가 취소돼도 같은 조회를 기다리는 다른 호출자에는 영향 없음
+        return await asyncio.shield(task)
+    
+    # supabase-py는 동기 클라이언트이므로 아래 조회는 이벤트 루프가 아닌 스레드에서 실행
+    
+    def _fetch_products(self, category: Optional[str], limit: Optional[int]) -> Tuple[List[Dict[str, Any]], int]:
+        query = self.supabase.table('insurance_products').select("*", count="exact")
+        if category:
+            query = query.eq('category_id', category)
+        return self._execute_page(query, limit)
+    
+    def _fetch_categories(self) -> List[Dict[str, Any]]:
+        return self.supabase.table('insurance_categories').select("*").execute().data
+    
+    def _fetch_faqs(self, category: Optional[str], limit: Optional[int]) -> Tuple[List[Dict[str, Any]], int]:
+        query = self.supabase.table('faqs').select("*", count="exact")
+        if category:
+            query = query.eq('category', category)
+        return self._execute_page(query, limit)
+    
+    def _fetch_testimonials(self, product_id: Optional[str], limit: Optional[int]) -> Tuple[List[Dict[str, Any]], int]:
+        query = self.supabase.table('customer_testimonials').select("*", count="exact")
+        if product_id:
+            query = query.eq('insurance_product_id', product_id)
+        return self._execute_page(query, limit)
+    
+    def _execute_page(self, query, limit: Optional[int]) -> Tuple[List[Dict[str, Any]], int]:
+        """DB 측 LIMIT 적용 후 실행 - 전체 개수는 count=exact 헤더로 함께 받음"""
+        if limit:
+            query = query.limit(limit)
+        result = query.execute()
+        total = result.count if result.count is not None else len(result.data)
+        return result.data, total
+
+# 전역 인스턴스 (import 시점이 아닌 첫 사용 시 한 번만 생성)
+_smart_ux_service: Optional[TrueDynamicSQLService] = None
+
+def get_smart_ux_service() -> TrueDynamicSQLService:
+    """진짜 동적 SQL 서비스 싱글턴 반환 - OpenAI 초기화 실패 시에도 ai_available=False 상태로 생성됨"""
+    global _smart_ux_service
+    if _smart_ux_service is None:
+        _smart_ux_service = TrueDynamicSQLService()
+    return _smart_ux_service
 
 # ===============================
 # 🔄 기존 ux_service.py 완전 호환성
 # ===============================
-ux_service = smart_ux_service  # 호환성을 위한 별칭 
\ No newline at end of file
+get_ux_service = get_smart_ux_service  # 호환성을 위한 별칭 (같은 싱글턴)